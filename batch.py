@@ -0,0 +1,107 @@
+#!/usr/bin/python3
+
+import os
+import sys
+import time
+import json
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+
+import vm
+
+
+
+#per worker state, set up once by load()
+worker = {}
+
+def load(code, mem_size, kind, threshold):
+    worker['code'] = code
+    worker['mem_size'] = mem_size
+    worker['kind'] = kind
+
+    #blocks take mem as argument, so one jit cache serves every run
+    worker['jit'] = None if threshold is None else vm.jit(threshold=threshold)
+
+
+#one instance, inputs form the initial data stack (last one is pulled first)
+def instance(inputs):
+    out = []
+    mem = vm.memory(worker['mem_size'], worker['kind'])
+
+    vm.engine(
+        worker['code'], mem, worker['jit'],
+        inputs = inputs,
+        emit = lambda x: out.append(str(x)),
+    )()
+
+    return out, vm.digest(mem)
+
+
+#run the build once per input set, returns [(debug output, memory digest)]
+def batch(code, runs, workers=None, mem_size=65536, kind='array', threshold=vm.jit.threshold):
+    workers = workers or os.cpu_count() or 1
+    chunk = max(1, len(runs) // (workers * 4))
+
+    with ProcessPoolExecutor(
+        max_workers = workers,
+        initializer = load,
+        initargs = (code, mem_size, kind, threshold),
+    ) as pool:
+        return list(pool.map(instance, runs, chunksize=chunk))
+
+
+#one run per line, whitespace separated ints
+def read_runs(path):
+    with open(path, 'r') as f:
+        return [
+            [int(x) for x in line.split()]
+            for line in f if line.strip()
+        ]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument('build')
+    parser.add_argument('inputs', nargs='?',
+        help='file with the initial data stack of one run per line')
+    parser.add_argument('-n', type=int, default=None,
+        help='number of runs, repeats the inputs (default: one per line)')
+    parser.add_argument('-j', '--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--memory', choices=vm.memories, default='array')
+    parser.add_argument('--mem-size', type=int, default=65536)
+    parser.add_argument('--no-jit', action='store_true')
+    parser.add_argument('-o', '--out', metavar='FILE',
+        help='write one json result per run')
+    args = parser.parse_args()
+
+    runs = read_runs(args.inputs) if args.inputs else [[]]
+    if args.n is not None:
+        runs = [runs[i % len(runs)] for i in range(args.n)]
+
+    prog = vm.load(args.build)
+    code = vm.bind(vm.decode(prog), vm.routine_table(prog, args.build))
+    code, _ = vm.fuse(code)
+
+    start = time.perf_counter()
+    results = batch(
+        code, runs, args.workers, args.mem_size, args.memory,
+        None if args.no_jit else vm.jit.threshold,
+    )
+    elapsed = time.perf_counter() - start
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            for inputs, (out, digest) in zip(runs, results):
+                f.write(json.dumps({
+                    'inputs': inputs, 'debug': out, 'digest': digest
+                }) + '\n')
+
+    print(
+        f"{len(runs)} runs in {elapsed:.4f}s on {args.workers} workers, "
+        f"{len(runs) / elapsed:.1f} runs/s",
+        file=sys.stderr
+    )
+
+
+if __name__ == '__main__':
+    main()
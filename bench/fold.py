@@ -0,0 +1,38 @@
+#!/usr/bin/python3
+
+#every program in prg/ built with and without constant folding: output
+#has to be the same, exits 1 if it is not. also counts folded nodes and
+#instructions executed
+
+import os
+import sys
+import glob
+import tempfile
+
+import runner
+
+os.chdir(runner.root) #use paths are relative to the repo
+
+
+def main():
+    failed = []
+
+    print(f"{'program':18} {'folded':>6} {'steps':>9} {'unfolded':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        for program in sorted(glob.glob('prg/*.snug')):
+            out, folds, steps = runner.run(program, build, [], 'folded')
+            plain, _, plain_steps = runner.run(program, build, ['--no-fold'], 'folded')
+
+            print(f"{program:18} {len(folds):6} {steps:9} {plain_steps:9}")
+            if out != plain:
+                failed.append(program)
+
+    for program in failed:
+        print(f"output of {program} changes with folding")
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
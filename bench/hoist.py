@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+#every program in prg/ built with and without loop invariant code motion:
+#output has to be the same, exits 1 if it is not. prg/alias.snug writes
+#memory its loops read through other names, its output and what gets
+#hoisted out of its loops are checked as well, so is what gets hoisted
+#out of the loops of prg/wrap.snug, which overflow. also counts hoisted
+#expressions and instructions executed
+
+import os
+import sys
+import glob
+import tempfile
+
+import runner
+
+os.chdir(runner.root) #use paths are relative to the repo
+
+
+#the sums of the loops of prg/alias.snug, then its comparisons
+alias_out = "56\n26\n42\n58\n28\nFalse\nFalse\n"
+
+#only the loop without writes and the one of the comparisons get
+#anything hoisted, in the order of the loops
+alias_hoisted = [
+    "((base - buf) * (buf . 1))",
+    "(buf . 1)",
+    "(buf . 0)",
+]
+
+#big * 4 is invariant in prg/wrap.snug, but past 64 bits and the left
+#operand of - and >, it would wrap in a temporary and not in the acc
+wrap_hoisted = []
+
+
+def main():
+    failed = []
+
+    print(f"{'program':18} {'isa':4} {'hoisted':>7} {'steps':>9} {'in loop':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        for program in sorted(glob.glob('prg/*.snug')):
+            for isa in ('acc', 'reg'):
+                out, hoisted, steps = runner.run(program, build, ['--isa', isa], 'hoisted')
+                plain, _, plain_steps = runner.run(program, build, ['--isa', isa, '--no-hoist'], 'hoisted')
+
+                print(f"{program:18} {isa:4} {len(hoisted):7} {steps:9} {plain_steps:9}")
+                if out != plain:
+                    failed.append(f"output of {program} ({isa}) changes with hoisting")
+
+                if program == 'prg/alias.snug':
+                    if out != alias_out:
+                        failed.append(f"prg/alias.snug ({isa}) prints {out.split()}")
+                    if hoisted != alias_hoisted:
+                        failed.append(f"prg/alias.snug ({isa}) hoists {hoisted}")
+
+                if program == 'prg/wrap.snug' and hoisted != wrap_hoisted:
+                    failed.append(f"prg/wrap.snug ({isa}) hoists {hoisted}")
+
+    for line in failed:
+        print(line)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
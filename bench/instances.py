@@ -0,0 +1,67 @@
+#!/usr/bin/python3
+
+#aggregate throughput of 1, 10 and 100 vm.VM instances time sliced on
+#one asyncio event loop, and the longest the loop went without a turn
+
+import os
+import sys
+import time
+import asyncio
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+counts = (1, 10, 100)
+
+
+async def serve(build, count, budget):
+    machines = [
+        vm.VM.load(build, jit=vm.jit(), emit=lambda x: None, budget=budget)
+        for _ in range(count)
+    ]
+
+    #a task that only measures how long it waits for its turn
+    gap = 0
+    running = True
+    async def ticker():
+        nonlocal gap
+        last = time.perf_counter()
+        while running:
+            await asyncio.sleep(0)
+            now = time.perf_counter()
+            gap = max(gap, now - last)
+            last = now
+
+    tick = asyncio.create_task(ticker())
+    start = time.perf_counter()
+    steps = await asyncio.gather(*(m.run() for m in machines))
+    elapsed = time.perf_counter() - start
+    running = False
+    await tick
+
+    return sum(steps), elapsed, gap
+
+
+def main():
+    program = sys.argv[1] if len(sys.argv) > 1 else 'bench/chunk.snug'
+    budget = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        runner.compile(program, build)
+
+        print(f"{program}, {budget} steps per slice")
+        print(f"{'instances':>9} {'steps':>12} {'wall s':>8} {'steps/s':>12} {'max gap ms':>11}")
+        for count in counts:
+            steps, elapsed, gap = asyncio.run(serve(build, count, budget))
+            print(f"{count:9} {steps:12} {elapsed:8.3f} {steps / elapsed:12.0f} {gap * 1000:11.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+#!/usr/bin/python3
+
+#tokenizer and parser throughput on a synthetic source of about 1M tokens
+
+import os
+import sys
+import time
+import string
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'compiler'))
+
+import lex
+import tree
+
+
+routine = """
+"generated
+rout {name}
+{{
+""" + """    put x = (x + {n}) * 2;
+    jump done ~ x >= 100;
+""" * 5 + """    lab done;
+}}
+"""
+
+#identifiers can not hold digits
+def name(n):
+    letters = ""
+    while True:
+        n, digit = divmod(n, 26)
+        letters += string.ascii_lowercase[digit]
+        if n == 0:
+            return "Gen::" + letters
+
+
+def source(path, count):
+    with open(path, 'w') as f:
+        for n in range(count):
+            f.write(routine.format(name=name(n), n=n))
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    target = int(float(sys.argv[1])) if len(sys.argv) > 1 else 1_000_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gen.snug')
+
+        source(path, 1)
+        per_routine = sum(1 for _ in lex.tokens(path))
+        source(path, target // per_routine)
+        size = os.path.getsize(path)
+
+        count, t_lex = timed(lambda: sum(1 for _ in lex.tokens(path)))
+        node, t_parse = timed(lambda: tree.parse(lex.tokenize(path)))
+
+    print(f"source           {size / 1e6:8.2f} MB, {count} tokens, {len(node)} routines")
+    print(f"tokenize         {t_lex:8.3f} s  {count / t_lex:12.0f} tokens/s")
+    print(f"tokenize + parse {t_parse:8.3f} s  {count / t_parse:12.0f} tokens/s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/python3
+
+#compile time of a synthetic program of dozens of modules, with one
+#process and with one per core. every module uses a few earlier ones,
+#so the use graph is a few breadths deep. the builds have to be the
+#same byte for byte, exits 1 if they are not
+
+import os
+import sys
+import time
+import string
+import tempfile
+
+import runner
+
+
+#modules every module uses, routines per module
+fan_in   = 3
+routines = 200
+
+
+#identifiers can not hold digits
+def name(n):
+    letters = ""
+    while True:
+        n, digit = divmod(n, 26)
+        letters += string.ascii_lowercase[digit]
+        if n == 0:
+            return letters
+
+
+def source(tmp, count):
+    for m in range(count):
+        with open(os.path.join(tmp, f"{name(m)}.snug"), 'w') as f:
+            for used in range(max(0, m - fan_in), m):
+                f.write(f"use '{tmp}/{name(used)}.snug';\n")
+            for n in range(routines):
+                f.write(f"rout Mod::{name(m)}::{name(n)}\n{{\n    pull x;\n")
+                f.write(f"    put i = 0;\n    lab loop;\n        put x = x + i * {n};\n")
+                f.write("        put i = i + 1;\n    jump loop ~ i < 3;\n")
+                if n + 1 < routines:
+                    f.write(f"    push x;\n    sub Mod::{name(m)}::{name(n + 1)};\n    pull x;\n")
+                f.write("    push x;\n}\n")
+
+    path = os.path.join(tmp, 'main.snug')
+    with open(path, 'w') as f:
+        for m in range(count):
+            f.write(f"use '{tmp}/{name(m)}.snug';\n")
+        f.write("rout main\n{\n    put sum = 0;\n")
+        for m in range(count):
+            f.write(f"    push {m};\n    sub Mod::{name(m)}::a;\n    pull x;\n    put sum = sum + x;\n")
+        f.write("    debug sum;\n}\n")
+    return path
+
+
+def build(path, target, jobs):
+    start = time.perf_counter()
+    runner.compile(path, target, ['-j', str(jobs)])
+    elapsed = time.perf_counter() - start
+
+    with open(target, 'rb') as f:
+        return f.read(), elapsed
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 36
+    cores = os.cpu_count() or 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = source(tmp, count)
+        serial, t_serial = build(path, os.path.join(tmp, 'serial'), 1)
+        parallel, t_parallel = build(path, os.path.join(tmp, 'parallel'), cores)
+
+    print(f"{count + 1} modules, {count * routines} routines, {cores} cores")
+    print(f"-j 1     {t_serial:8.3f} s")
+    print(f"-j {cores:<5} {t_parallel:8.3f} s  {t_serial / t_parallel:.2f}x")
+
+    if serial != parallel:
+        print("builds differ")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
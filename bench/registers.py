@@ -0,0 +1,72 @@
+#!/usr/bin/python3
+
+#accumulator vs register isa: steps and wall time of the same programs
+#compiled with --isa acc and --isa reg, which have to print the same.
+#prg/wrap.snug checks that intermediates past 64 bits do not wrap in either
+
+import os
+import sys
+import time
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+programs = ['prg/fac.snug', 'prg/fib.snug', 'prg/chunk.snug', 'prg/wrap.snug', 'bench/warm.snug']
+isas = ('acc', 'reg')
+
+
+def best(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def build(path, isa, tmp):
+    target = os.path.join(tmp, f"{os.path.basename(path)}.{isa}")
+    runner.compile(path, target, ['--isa', isa])
+    prog = vm.load(target)
+    code = vm.bind(vm.decode(prog), vm.routine_table(prog, target))
+    code, _ = vm.fuse(code)
+    return code
+
+
+def measure(code, repeat):
+    out = []
+    steps = vm.engine(code, vm.memory(), emit=out.append)(count=True)
+
+    def interp(): vm.engine(code, vm.memory(), emit=lambda x: None)()
+    def jitted(): vm.engine(code, vm.memory(), vm.jit(), emit=lambda x: None)()
+
+    return out, steps, best(interp, repeat), best(jitted, repeat)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    print(f"{'program':18} {'isa':4} {'steps':>10} {'interp ms':>10} {'jit ms':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for path in programs:
+            results = {isa: measure(build(path, isa, tmp), repeat) for isa in isas}
+            assert results['acc'][0] == results['reg'][0], f"{path}: output differs between isas"
+
+            for isa, (_, steps, interp, jitted) in results.items():
+                print(f"{path:18} {isa:4} {steps:10} {interp * 1000:10.3f} {jitted * 1000:10.3f}")
+
+            acc, reg = results['acc'], results['reg']
+            print(
+                f"{'':18} {'':4} {acc[1] / reg[1]:9.2f}x "
+                f"{acc[2] / reg[2]:9.2f}x {acc[3] / reg[3]:9.2f}x"
+            )
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,87 @@
+#!/usr/bin/python3
+
+#compile time of a synthetic program of 10k routines. each one calls the
+#next, so the call chain is as long as the program, and a few earlier ones.
+#generate is the whole program emission of objs._rout.generate, compile,
+#object and link the separate compilation main.py does
+
+import os
+import sys
+import time
+import string
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(root, 'compiler'))
+
+import tree
+import image
+import emission
+import link
+
+
+#earlier routines every routine calls as well
+fan_in = 3
+
+
+#identifiers can not hold digits
+def name(n):
+    letters = ""
+    while True:
+        n, digit = divmod(n, 26)
+        letters += string.ascii_lowercase[digit]
+        if n == 0:
+            return "Gen::" + letters
+
+
+def source(path, count):
+    with open(path, 'w') as f:
+        f.write(f"rout main\n{{\n    sub {name(0)};\n}}\n")
+        for n in range(count):
+            f.write(f"rout {name(n)}\n{{\n    put x = {n};\n")
+            for callee in range(max(0, n - fan_in), n):
+                f.write(f"    sub {name(callee)};\n")
+            if n + 1 < count:
+                f.write(f"    sub {name(n + 1)};\n")
+            f.write("}\n")
+
+
+def timed(f):
+    start = time.perf_counter()
+    result = f()
+    return result, time.perf_counter() - start
+
+
+def main():
+    count = int(float(sys.argv[1])) if len(sys.argv) > 1 else 10_000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'gen.snug')
+        source(path, count)
+
+        node, t_prepare = timed(lambda: tree.prepare(path))
+
+        output = emission.output()
+        def generate():
+            node.get_routine('main').generate(output, node)
+        _, t_generate = timed(generate)
+
+        obj, t_compile = timed(lambda: link.compile(path, tree.cache()))
+        raw, t_write = timed(lambda: link.encode(obj))
+        _, t_read = timed(lambda: link.decode(raw, path))
+        linked, t_link = timed(lambda: link.link([obj]))
+
+        origin = linked.lookup_routine('main')
+        _, t_encode = timed(lambda: image.encode(linked, origin))
+
+    print(f"{count} routines, {len(output.routine_mapper)} emitted, {output.addr} instructions")
+    print(f"prepare  {t_prepare:8.3f} s")
+    print(f"generate {t_generate:8.3f} s")
+    print(f"compile  {t_compile:8.3f} s")
+    print(f"object   {t_write:8.3f} s write, {t_read:.3f} s read, {len(raw) / 1e6:.2f} MB")
+    print(f"link     {t_link:8.3f} s")
+    print(f"encode   {t_encode:8.3f} s")
+
+
+if __name__ == '__main__':
+    main()
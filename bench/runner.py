@@ -0,0 +1,33 @@
+#building and running programs for the checks and benchmarks of bench/.
+#builds never use the module cache, so nothing is written into the repo
+
+import os
+import re
+import sys
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+#build program to build with flags
+def compile(program, build, flags=()):
+    subprocess.run(
+        [sys.executable, os.path.join(root, 'compiler/main.py'), program, '-o', build,
+            '--no-cache', *flags],
+        check=True
+    )
+
+#build program to build with flags and run it. returns the output, the
+#annotations '"\t<note> ...' of the build without the note, and the steps
+def run(program, build, flags, note):
+    compile(program, build, ['--text', *flags])
+    prefix = f'"\t{note} '
+    with open(build) as f:
+        notes = [line[len(prefix):].rstrip('\n') for line in f if line.startswith(prefix)]
+
+    done = subprocess.run(
+        [sys.executable, os.path.join(root, 'vm.py'), build, '--stats'],
+        stdin=subprocess.DEVNULL, capture_output=True, text=True, check=True
+    )
+    steps = int(re.search(r'(\d+) steps', done.stderr).group(1))
+    return done.stdout, notes, steps
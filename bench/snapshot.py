@@ -0,0 +1,90 @@
+#!/usr/bin/python3
+
+#cold start vs warm start from a snapshot of bench/warm.snug, natives
+#bound like vm.py does. also restores a snapshot one vm.py process took in
+#another one, which has to print what the cold run printed after it
+
+import os
+import sys
+import time
+import tempfile
+import subprocess
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+def best(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 5
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        snap  = os.path.join(tmp, 'snap')
+
+        runner.compile('bench/warm.snug', build)
+        prog = vm.load(build)
+        code, _ = vm.fuse(vm.bind(vm.decode(prog), vm.routine_table(prog, build)))
+        ident = vm.fingerprint(code)
+
+        out = []
+        reached = []
+        before = []
+        def hook(*state):
+            reached.append(time.perf_counter())
+            before.append(len(out))
+            vm.save_snapshot(snap, ident, *state)
+
+        #cold: everything from the start, noting when the snapshot is hit
+        start = time.perf_counter()
+        vm.engine(code, vm.memory(), vm.jit(), emit=out.append, on_snapshot=hook)()
+        setup = reached[0] - start
+
+        def cold():
+            vm.engine(code, vm.memory(), vm.jit(), emit=lambda x: None)()
+
+        def restore():
+            return vm.load_snapshot(snap)
+
+        warm_out = []
+        def warm():
+            warm_out.clear()
+            _, state, mem = vm.load_snapshot(snap)
+            vm.engine(code, mem, vm.jit(), emit=warm_out.append, resume=state)()
+
+        t_cold    = best(cold, repeat)
+        t_restore = best(restore, repeat)
+        t_warm    = best(warm, repeat)
+
+        assert warm_out == out, "warm start diverged from cold start"
+
+        def process(*flags):
+            return subprocess.run(
+                [sys.executable, 'vm.py', build, *flags],
+                capture_output=True, text=True, check=True
+            ).stdout.splitlines()
+
+        process('--snapshot', snap)
+        after = process('--restore', snap)
+        assert after == [str(x) for x in out[before[0]:]], "restore in another process diverged"
+
+        print(f"setup until snapshot  {setup * 1000:9.3f} ms")
+        print(f"restore snapshot      {t_restore * 1000:9.3f} ms  ({setup / t_restore:.1f}x faster)")
+        print(f"cold run              {t_cold * 1000:9.3f} ms")
+        print(f"warm run              {t_warm * 1000:9.3f} ms  ({t_cold / t_warm:.1f}x faster)")
+
+
+if __name__ == '__main__':
+    main()
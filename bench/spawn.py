@@ -0,0 +1,55 @@
+#!/usr/bin/python3
+
+#partitioned fill and sum of bench/spawn.snug on 1, 2, 4, ... workers
+
+import os
+import sys
+import time
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+mem_size = 1 << 20
+
+
+def main():
+    repeat = int(sys.argv[1]) if len(sys.argv) > 1 else 3
+
+    counts = [1]
+    while counts[-1] * 2 <= (os.cpu_count() or 1):
+        counts.append(counts[-1] * 2)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        runner.compile('bench/spawn.snug', build)
+        prog = vm.load(build)
+        code, _ = vm.fuse(vm.decode(prog))
+
+        print(f"{'workers':>7} {'wall s':>8} {'speedup':>8}  output")
+        first = None
+        for count in counts:
+            times = []
+            for _ in range(repeat):
+                pool = vm.workers(code, mem_size, count)
+                out = []
+
+                #forking the workers is part of every run
+                start = time.perf_counter()
+                vm.engine(code, pool.mem, vm.jit(), emit=out.append, workers=pool)()
+                times.append(time.perf_counter() - start)
+
+                pool.close()
+
+            elapsed = min(times)
+            first = first or elapsed
+            print(f"{count:7} {elapsed:8.3f} {first / elapsed:7.2f}x  {out}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,75 @@
+#!/usr/bin/python3
+
+#VM.step(n) with the jit runs exactly n steps: every program in prg/ and
+#the loops of bench/ are stepped by random amounts with and without the
+#jit, and after each step both machines have to be in the same state.
+#exits 1 if they are not, or if the jit compiled nothing to check
+
+import os
+import sys
+import glob
+import random
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+sizes = (1, 2, 3, 7, 16, 100, 255, 256, 257, 1000, 5000)
+
+#cat reads stdin, the workers of spawn run on a pool of their own
+skip = ('prg/cat.snug', 'prg/spawn.snug')
+programs = [x for x in sorted(glob.glob('prg/*.snug')) if x not in skip] + \
+    ['bench/fib.snug', 'bench/chunk.snug']
+
+
+def check(build, seed):
+    rng = random.Random(seed)
+    out_jit, out_plain = [], []
+    fast  = vm.VM.load(build, jit=vm.jit(), emit=out_jit.append)
+    plain = vm.VM.load(build, emit=out_plain.append)
+
+    calls = 0
+    while not plain.done:
+        n = rng.choice(sizes)
+        ran, expected = fast.step(n), plain.step(n)
+        if ran != expected or fast.state != plain.state:
+            return f"step({n}) ran {ran} steps, {expected} without the jit", calls, 0
+        calls += 1
+
+    if out_jit != out_plain:
+        return "output differs", calls, len(fast.jit.cache)
+    return None, calls, len(fast.jit.cache)
+
+
+def main():
+    failed = []
+    blocks = 0
+
+    print(f"{'program':18} {'calls':>7} {'blocks':>6}")
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        for program in programs:
+            runner.compile(program, build)
+            error, calls, compiled = check(build, 0)
+            blocks += compiled
+
+            print(f"{program:18} {calls:7} {compiled:6}")
+            if error:
+                failed.append(f"{program}: {error}")
+
+    if not blocks:
+        failed.append("the jit compiled no blocks")
+
+    for line in failed:
+        print(line)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,172 @@
+#!/usr/bin/python3
+
+#benchmark suite: compile time, vm steps, steps/sec and peak memory of
+#every program, saved as json and checked against a stored baseline
+
+import os
+import sys
+import json
+import time
+import hashlib
+import argparse
+import platform
+import tempfile
+import tracemalloc
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+sys.path.insert(0, os.path.join(root, 'compiler'))
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import main as compiler
+
+
+suite = {
+    'fac':   'bench/fac.snug',   #recursion
+    'fib':   'bench/fib.snug',   #tight loop
+    'heap':  'bench/heap.snug',  #Heap::New / Heap::Void churn
+    'dyn':   'bench/dyn.snug',   #Dyn growth
+    'chunk': 'bench/chunk.snug', #Chunk operations
+}
+
+#relative slack before a timing or memory figure counts as a regression.
+#steps and output are deterministic and have to match exactly
+tolerance = 0.15
+
+
+def best(f, repeat):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        f()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+#decoded engine as vm.py runs it by default
+def prepare(target):
+    prog = vm.load(target)
+    code = vm.bind(vm.decode(prog), vm.routine_table(prog, target))
+    code, _ = vm.fuse(code)
+    return code
+
+
+def measure(path, target, isa, use_jit, repeat):
+    def build():
+        compiler.compile(path, target, isa=isa)
+
+    def run(emit=lambda x: None, count=False):
+        tier = vm.jit() if use_jit else None
+        return vm.engine(prepare(target), vm.memory(), tier, emit=emit)(count=count)
+
+    compile_s = best(build, repeat)
+
+    out = []
+    steps = run(out.append, count=True)
+    run_s = best(run, repeat)
+
+    tracemalloc.start()
+    build()
+    run()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'compile_s':   compile_s,
+        'steps':       steps,
+        'run_s':       run_s,
+        'steps_per_s': steps / run_s,
+        'peak_kib':    peak / 1024,
+        'output':      hashlib.sha256("\n".join(map(str, out)).encode()).hexdigest()[:16],
+    }
+
+
+#list of regressions of results against baseline
+def compare(results, baseline):
+    found = []
+    for name, now in results['benchmarks'].items():
+        then = baseline['benchmarks'].get(name)
+        if then is None:
+            continue
+
+        if now['output'] != then['output']:
+            found.append(f"{name}: output changed")
+        if now['steps'] > then['steps']:
+            found.append(f"{name}: steps {then['steps']} -> {now['steps']}")
+
+        for key in ('compile_s', 'run_s', 'peak_kib'):
+            if now[key] > then[key] * (1 + tolerance):
+                found.append(f"{name}: {key} {then[key]:.4g} -> {now[key]:.4g} "
+                    f"(+{(now[key] / then[key] - 1) * 100:.0f}%)")
+    return found
+
+
+def main():
+    global tolerance
+
+    parser = argparse.ArgumentParser()
+    parser.add_argument('names', nargs='*', choices=[[], *suite], metavar='NAME',
+        help=f"benchmarks to run (default: all of {', '.join(suite)})")
+    parser.add_argument('--repeat', type=int, default=5,
+        help='runs per measurement, the best one counts')
+    parser.add_argument('--isa', choices=compiler.isas, default='acc')
+    parser.add_argument('--no-jit', action='store_true')
+    parser.add_argument('-o', '--out', default='bench/results.json', metavar='FILE')
+    parser.add_argument('--baseline', default='bench/baseline.json', metavar='FILE',
+        help='flag regressions against these results, if the file exists')
+    parser.add_argument('--save-baseline', action='store_true',
+        help='store the results as the new baseline')
+    parser.add_argument('--tolerance', type=float, default=tolerance)
+    args = parser.parse_args()
+
+    tolerance = args.tolerance
+
+    results = {
+        'python':     platform.python_version(),
+        'machine':    platform.machine(),
+        'isa':        args.isa,
+        'jit':        not args.no_jit,
+        'benchmarks': {},
+    }
+
+    print(f"{'name':6} {'compile ms':>10} {'steps':>10} {'run ms':>10} {'steps/s':>12} {'peak KiB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in args.names or suite:
+            target = os.path.join(tmp, name)
+            r = measure(suite[name], target, args.isa, not args.no_jit, args.repeat)
+            results['benchmarks'][name] = r
+            print(
+                f"{name:6} {r['compile_s'] * 1000:10.2f} {r['steps']:10} "
+                f"{r['run_s'] * 1000:10.2f} {r['steps_per_s']:12.0f} {r['peak_kib']:9.0f}"
+            )
+
+    with open(args.out, 'w') as f:
+        json.dump(results, f, indent=2)
+
+    if args.save_baseline:
+        with open(args.baseline, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"baseline saved to {args.baseline}")
+        return
+
+    if not os.path.exists(args.baseline):
+        return
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+
+    if (baseline['isa'], baseline['jit']) != (results['isa'], results['jit']):
+        print(f"{args.baseline} was taken with isa {baseline['isa']}, jit {baseline['jit']}; not compared")
+        return
+
+    regressions = compare(results, baseline)
+    for line in regressions:
+        print(f"regression  {line}")
+    if regressions:
+        sys.exit(1)
+    print(f"no regressions against {args.baseline}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,57 @@
+#!/usr/bin/python3
+
+#system stack use of the 100k deep recursion in prg/tail.snug, built with
+#and without tail calls. with them the stack has to stay the same at any
+#depth, exits 1 if it does not
+
+import os
+import sys
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+#room for the frames of the build without tail calls
+mem_size = 1 << 21
+
+#steps between samples of the stack pointer
+every = 64
+
+
+def peak(build):
+    out = []
+    machine = vm.VM.load(build, mem=vm.memory(mem_size), emit=out.append)
+
+    highest = 0
+    while machine.step(every):
+        highest = max(highest, machine.state[3])
+    return out, machine.steps, highest
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmp:
+        results = {}
+        for name, flags in (('tail', []), ('no tail', ['--no-tail'])):
+            build = os.path.join(tmp, name.replace(' ', '_'))
+            runner.compile('prg/tail.snug', build, flags)
+            results[name] = peak(build)
+
+    print(f"{'build':8} {'steps':>9} {'peak stack':>11}  output")
+    for name, (out, steps, highest) in results.items():
+        print(f"{name:8} {steps:9} {highest:11}  {out}")
+
+    assert results['tail'][0] == results['no tail'][0], "output differs"
+
+    #main's frame plus the one frame every level of Sum shares
+    if results['tail'][2] > 16:
+        print("tail calls do not keep the stack constant")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,76 @@
+#!/usr/bin/python3
+
+#overflow semantics of the vm memories on prg/wrap.snug: values past
+#+-2^63 stored to array memory wrap around in two's complement, list
+#memory keeps them as they are, and values that are only in the acc never
+#wrap. runs with and without the jit, exits 1 on any difference
+
+import os
+import sys
+import tempfile
+
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, root)
+os.chdir(root) #use paths are relative to the repo
+
+import vm
+import runner
+
+
+#what prg/wrap.snug prints on list memory, and whether the value went
+#through memory (or only through the acc) before it was printed
+expected = [
+    (1 << 63,          True),
+    (1 << 64,          False),
+    (-(1 << 63) - 1,   True),
+    (3 << 62,          True),
+    (1 << 63,          True),
+    (1 << 70,          True),
+    (1 << 64,          False),
+    (True,             False),
+    ((1 << 64) - 1,    False),
+    (True,             False),
+    (True,             True),
+]
+
+
+def run(build, kind, use_jit):
+    out = []
+    machine = vm.VM.load(build, mem=vm.memory(kind=kind), jit=vm.jit() if use_jit else None, emit=out.append)
+    machine.step(10 ** 6)
+    assert machine.done, "prg/wrap.snug did not finish"
+    return out
+
+
+def main():
+    unbounded = [x for x, _ in expected]
+    wrapped = [vm.wrap(x) if stored else x for x, stored in expected]
+
+    failed = []
+    with tempfile.TemporaryDirectory() as tmp:
+        build = os.path.join(tmp, 'build')
+        for flags in ([], ['--no-peephole'], ['--no-hoist'], ['--isa', 'reg'], ['--isa', 'reg', '--no-hoist']):
+            runner.compile('prg/wrap.snug', build, flags)
+            for use_jit in (True, False):
+                what = f"{' '.join(flags) or 'default'}, {'jit' if use_jit else 'no jit'}"
+
+                array = run(build, 'array', use_jit)
+                listed = run(build, 'list', use_jit)
+
+                if listed != unbounded:
+                    failed.append(f"list memory ({what}): {listed}")
+                if array != wrapped:
+                    failed.append(f"array memory ({what}): {array}")
+                if array != [vm.wrap(x) if stored else x for x, (_, stored) in zip(listed, expected)]:
+                    failed.append(f"array memory does not wrap what list memory keeps ({what})")
+
+    print(f"{'list':5} {' '.join(map(str, unbounded))}")
+    print(f"{'array':5} {' '.join(map(str, wrapped))}")
+    for line in failed:
+        print(line)
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -42,17 +42,43 @@ class anno:
 
 @dataclass
 class output:
-    seq : list[command | anno] = field(default_factory=lambda: []) 
+    seq : list[command | anno] = field(default_factory=lambda: [
+        command('call', None), command('halt', None) #link header, see below
+    ])
     addr : int = 0
 
     # maps definition to address
     definition_mapper : dict[tuple[str, str], int] = field(default_factory=lambda: {})
     routine_mapper    : dict[str, int]             = field(default_factory=lambda: {})
 
-    #the link header gets put at the start of the build executable.
+    #size of the register file expressions may use, 0 for the accumulator isa
+    registers : int = 0
+
+    #turn calls right before a routine's epilogue into tail calls
+    tail_calls : bool = True
+
+    #emit operator subtrees on numbers and constants as a single const
+    fold : bool = True
+
+    #variables that are never live at once share a frame slot
+    share_slots : bool = True
+
+    #calls to routines of at most this many statements are inlined, 0 for none.
+    #intrinsics only with inline_intrinsics, the vm may run them natively
+    inline : int = 6
+    inline_intrinsics : bool = False
+
+    #compute loop invariant subtrees once before the loop, see hoist.py
+    hoist : bool = True
+
+    #names of the peephole.rules to run on routines, None for all of them
+    peephole : tuple[str, ...] | None = None
+
+    #the link header is at the start of the build executable.
     #it consists of 2 commands to call the main routine:
     #   call <address of main>
     #   halt
+    #seq starts out with it, assemble fills in the address
     link_header_size = 2
 
 
@@ -96,8 +122,7 @@ class output:
         return "\n".join(map(str, self.seq))
 
     def assemble(self, entry_origin):
-        self.seq.insert(0, command('call', entry_origin))
-        self.seq.insert(1, command('halt', None))
+        self.seq[0].arg = entry_origin
 
         return self.render()
 
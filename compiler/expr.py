@@ -4,6 +4,51 @@ from dataclasses import dataclass
 import sym
 import error
 
+
+#three address forms of the operators for the register isa
+#(see register_ops in vm.py), the rest is generated for the acc
+reg_ops = {
+    sym.op_add:     'radd',
+    sym.op_sub:     'rsub',
+    sym.op_mul:     'rmul',
+    sym.op_bit_and: 'rand',
+    sym.op_bit_or:  'ror',
+    sym.op_gt:      'rgreater',
+    sym.op_lt:      'rlesser',
+    sym.op_eq:      'requal',
+    sym.op_ge:      'rge',
+    sym.op_le:      'rle',
+    sym.op_boo_and: 'randb',
+    sym.op_boo_or:  'rorb',
+    sym.op_dot:     'rfield',
+}
+
+#operators that write to their left side
+writing = (sym.op_assign, sym.op_pre_add, sym.op_post_add, sym.op_pre_sub, sym.op_post_sub)
+
+#operators on constants, computed the way the vm does with the left side
+#in the acc (see generate_acc). comparisons give bools like the vm does.
+#not !=, the vm has no nequal and leaves the acc as it is, whatever that
+#is at runtime
+folds = {
+    sym.op_add:     lambda l, r: l + r,
+    sym.op_sub:     lambda l, r: l - r,
+    sym.op_mul:     lambda l, r: l * r,
+    sym.op_bit_and: lambda l, r: l & r,
+    sym.op_bit_or:  lambda l, r: l | r,
+    sym.op_gt:      lambda l, r: l > r,
+    sym.op_lt:      lambda l, r: l < r,
+    sym.op_eq:      lambda l, r: l == r,
+    sym.op_ge:      lambda l, r: l + 1 > r,
+    sym.op_le:      lambda l, r: l - 1 < r,
+    sym.op_boo_and: lambda l, r: 1 & (l & r),
+    sym.op_boo_or:  lambda l, r: 1 & (l | r),
+}
+
+#range of const operands, see image.py
+int_min = -(1 << 63)
+int_max =  (1 << 63) - 1
+
 @dataclass
 class node:
     kind : str
@@ -11,6 +56,16 @@ class node:
     left  : 'node | None' = None
     right : 'node | None' = None
 
+    def __str__(self):
+        match self.kind:
+            case 'op':
+                return f"({self.left} {self.content} {self.right})"
+            case 'char':
+                return repr(self.content)
+            case 'string':
+                return f"'{self.content}'"
+        return str(self.content)
+
     def infer(self, ctx):
         #only variable can infer
         if self.kind == 'var':
@@ -20,6 +75,33 @@ class node:
             if type(self.left) is node:
                 self.left.infer(ctx)
 
+    #add the variables the expression reads and writes to reads and writes.
+    #returns how many writes may come before one of its reads, which is
+    #every write but the top one if it is the last thing the statement does
+    def access(self, ctx, reads, writes, last=False):
+        match self.kind:
+            case 'var' if self.content in ctx.vars:
+                reads.add(self.content)
+            case 'op' if type(self.left) is node and type(self.right) is node:
+                early = self.right.access(ctx, reads, writes)
+                if self.content not in writing:
+                    return early + self.left.access(ctx, reads, writes)
+
+                if self.content != sym.op_assign:
+                    early += self.left.access(ctx, reads, writes)
+                early += self.left.target(ctx, reads, writes)
+                if not last and self.left.kind == 'var' and self.left.content in ctx.vars:
+                    early += 1
+                return early
+        return 0
+
+    #as access, for the expression written to as the last thing
+    def target(self, ctx, reads, writes):
+        if self.kind == 'var' and self.content in ctx.vars:
+            writes.add(self.content)
+            return 0
+        return self.access(ctx, reads, writes)
+
     #generate reads from acc
     def write(self, output, ctx):
         #either variable or dot operator
@@ -47,14 +129,141 @@ class node:
                 
 
      
+    #value of the expression if it only depends on numbers and constants,
+    #None otherwise. variables shadow constants as in generate_acc.
+    #operators beyond 64 bits are left to the vm: a pushed operand wraps
+    #with array memory while the acc does not
+    def value(self, ctx):
+        match self.kind:
+            case 'num':
+                return self.content
+            case 'char':
+                return ord(self.content)
+            case 'var' if self.content in ctx.vars:
+                return None
+            case 'var' if self.content in ctx.tree.consts:
+                return ctx.tree.consts[self.content]
+            case 'op' if self.content in folds and \
+                    type(self.left) is node and type(self.right) is node:
+                right = self.right.value(ctx)
+                if right is None:
+                    return None
+                left = self.left.value(ctx)
+                if left is None:
+                    return None
+                value = folds[self.content](left, right)
+                if not int_min <= value <= int_max:
+                    return None
+                return value
+        return None
+
+    #value of a constant operator subtree that may be emitted as a single
+    #const, None if it may not. bools stay computed, the vm keeps them
+    #apart from ints (debug shows True), but their operands may still fold
+    def folded(self, output, ctx):
+        if not output.fold or self.kind != 'op':
+            return None
+
+        value = self.value(ctx)
+        if type(value) is not int:
+            return None
+
+        output.annotate(f'"\tfolded {self} = {value}')
+        return value
+
+    #emit the subtree folded, true if it could be
+    def fold(self, output, ctx, dst=0):
+        value = self.folded(output, ctx)
+        if value is None:
+            return False
+
+        if dst == 0:
+            output('const', value)
+        else:
+            output('rmov', f"r{dst},{value}")
+        return True
+
     #generate outputs to acc
     def generate(self, output, ctx):
+        if output.registers:
+            self.generate_register(output, ctx, 0)
+        else:
+            self.generate_acc(output, ctx)
+
+    #nothing in the expression writes
+    def pure(self):
+        if self.kind != 'op' or type(self.left) is not node or type(self.right) is not node:
+            return True
+        return self.content not in writing and self.left.pure() and self.right.pure()
+
+    #source operand of a leaf or folded subtree for the register isa,
+    #None if it is neither
+    def operand(self, output, ctx):
+        value = self.folded(output, ctx)
+        if value is not None:
+            return str(value)
+
+        match self.kind:
+            case 'num':
+                return str(self.content)
+            case 'char':
+                return str(ord(self.content))
+            case 'var' if self.content in ctx.vars:
+                return f"s{ctx.vars[self.content]}"
+            case 'var' if self.content in ctx.tree.consts:
+                return str(ctx.tree.consts[self.content])
+        return None
+
+    #generate outputs to register dst, r0 is the acc.
+    #operands are evaluated right to left just like generate_acc does.
+    #the right one goes to a scratch register, which wraps like the push
+    #of generate_acc, the left one to r0, which stays unbounded like the
+    #acc. r0 is free then, nothing is kept in it while a subtree runs.
+    #whatever has no three address form (or runs out of registers) is
+    #generated for the acc and moved
+    def generate_register(self, output, ctx, dst):
+        if self.fold(output, ctx, dst):
+            return
+
+        floor = ctx.reg_floor
+        inst = reg_ops.get(self.content) if self.kind == 'op' else None
+
+        if inst is None or floor + 1 >= output.registers or \
+                type(self.left) is not node or type(self.right) is not node:
+            self.generate_acc(output, ctx)
+            if dst != 0:
+                output('rmov', f"r{dst},r0")
+            return
+
+        free = floor
+
+        #a variable on the right is read before the left side could write it
+        right = self.right.operand(output, ctx)
+        if right is None or (right[0] == 's' and not self.left.pure()):
+            ctx.reg_floor = free + 1
+            self.right.generate_register(output, ctx, free)
+            right = f"r{free}"
+            free += 1
+
+        left = self.left.operand(output, ctx)
+        if left is None:
+            ctx.reg_floor = free
+            self.left.generate_register(output, ctx, 0)
+            left = "r0"
+
+        ctx.reg_floor = floor
+        output(inst, f"r{dst},{left},{right}")
+
+    def generate_acc(self, output, ctx):
         def bool_normalize():
             output('push')
             output('const', 1)
             output('and')
 
 
+        if self.fold(output, ctx):
+            return
+
         vars = ctx.vars
         match self.kind:
             case 'num':
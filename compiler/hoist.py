@@ -0,0 +1,199 @@
+import copy
+import itertools
+import dataclasses
+
+import objs
+import expr
+import sym
+import tree
+import inline
+
+
+#loop invariant code motion. a loop is a lab with jumps back to it from
+#further down, everything in between is its body. operator subtrees in
+#the body that read nothing the body writes are computed once into a
+#temporary right before the lab and read from it on every iteration.
+#the temporary wraps to 64 bits with array memory, where the acc does
+#not, so only subtrees that are pushed anyway (right operands) or fit
+#in a word are hoisted
+
+#operators giving a bool, which a variable would turn into an int
+bools = (sym.op_gt, sym.op_lt, sym.op_eq, sym.op_neq, sym.op_ge, sym.op_le)
+
+#statements that may write memory other than through a . target: calls
+#and workers may write anything, recv fills a range, trans takes memory
+writes_memory = (objs._sub, objs._spawn, objs._join, objs._recv, objs._trans)
+
+
+#the subtree may give a bool
+def boolean(x):
+    if x.kind != 'op':
+        return False
+    if x.content in bools:
+        return True
+    if x.content in (sym.op_bit_and, sym.op_bit_or):
+        return boolean(x.left) or boolean(x.right)
+    return False
+
+#the subtree gives a value that fits in a memory word: what is read from
+#memory, and bitwise operators on such values. leaves are emitted as
+#64 bit consts or loads
+def word(x):
+    if x.kind != 'op' or type(x.left) is not expr.node or type(x.right) is not expr.node:
+        return True
+    if x.content == sym.op_dot:
+        return True
+    if x.content in (sym.op_bit_and, sym.op_bit_or):
+        return word(x.left) and word(x.right)
+    return False
+
+#the subtree reads memory
+def dereferences(x):
+    if x.kind != 'op' or type(x.left) is not expr.node or type(x.right) is not expr.node:
+        return False
+    return x.content == sym.op_dot or dereferences(x.left) or dereferences(x.right)
+
+#the expressions of stmt by field name, with whether they are written
+#to as a whole
+def expressions(stmt):
+    targets = getattr(stmt, 'targets', ())
+    for f in dataclasses.fields(stmt):
+        x = getattr(stmt, f.name)
+        if type(x) is expr.node:
+            yield f.name, x, f.name in targets
+
+#stmt writes memory through a . (enref), directly or as the target of an operator
+def enrefs(stmt):
+    def through(x, whole):
+        if x.kind != 'op' or type(x.left) is not expr.node or type(x.right) is not expr.node:
+            return False
+        if whole and x.content == sym.op_dot:
+            return True
+        left = x.content in expr.writing
+        return through(x.left, left) or through(x.right, False)
+
+    return any(through(x, whole) for _, x, whole in expressions(stmt))
+
+
+#loops of body as (lab, last jump back) index pairs, innermost first.
+#only loops control enters at the lab alone, from right above it or the
+#body itself, may get statements before the lab
+def loops(body):
+    labels = {}
+    for at, x in enumerate(body):
+        if type(x) is objs._lab:
+            if x.label in labels:
+                return [] #the emitter rejects these anyway
+            labels[x.label] = at
+
+    ends = {}
+    for at, x in enumerate(body):
+        if type(x) is objs._jump and labels.get(x.label, at + 1) <= at:
+            ends[labels[x.label]] = at
+
+    found = []
+    for head, end in ends.items():
+        entered = any(
+            type(x) is objs._jump and head <= labels.get(x.label, -1) <= end
+            for x in body[:head] + body[end + 1:]
+        )
+        deferred = any(type(x) is objs._defer for x in body[head:end + 1])
+        if not entered and not deferred:
+            found.append((head, end))
+
+    return sorted(found, key=lambda loop: loop[1] - loop[0])
+
+
+#routine with the invariant subtrees of its loops hoisted, and the
+#subtrees hoisted, or routine itself and nothing if there are none.
+#the copy keeps the shared parsed tree as it is
+def expand(routine, scope):
+    if not loops(routine.sapling.subs):
+        return routine, []
+
+    body = copy.deepcopy(routine.sapling.subs)
+    hoisted = []
+
+    done = set()
+    while True:
+        todo = [loop for loop in loops(body) if body[loop[0]].label not in done]
+        if not todo:
+            break
+        head, end = todo[0]
+        done.add(body[head].label)
+
+        current = objs._rout(name=routine.name, sapling=tree.node(subs=body))
+        temps = loop(current, scope, head, end, len(hoisted))
+        body[head:head] = [
+            objs._put(expr.node('op', sym.op_assign, expr.node('var', name), x))
+            for name, x in temps
+        ]
+        hoisted += [x for _, x in temps]
+
+    if not hoisted:
+        return routine, []
+    return objs._rout(name=routine.name, sapling=tree.node(subs=body)), hoisted
+
+#replace the invariant subtrees of the loop from statement head to end
+#of routine by temporaries, numbered from first. returns the temporaries
+#and the subtrees to compute into them
+def loop(routine, scope, head, end, first):
+    ctx = objs._rout._ctx(
+        vars = inline.variables(routine, scope),
+        var_allocer = itertools.count(),
+        tree = scope,
+        routine = routine
+    )
+
+    stmts = routine.sapling.subs[head + 1 : end + 1]
+    written = set()
+    for stmt in stmts:
+        written |= objs.access(stmt, ctx)[1]
+    memory = any(type(x) in writes_memory or enrefs(x) for x in stmts)
+
+    #statements every entry into the loop runs, up to and with the first
+    #jump. only memory they read anyway is read before the lab
+    sure = 0
+    while sure < len(stmts) and type(stmts[sure]) is not objs._lab:
+        sure += 1
+        if type(stmts[sure - 1]) is objs._jump:
+            break
+
+    temps = []
+    def invariant(x, runs, pushed):
+        if x.kind != 'op' or not x.pure() or boolean(x) or x.value(ctx) is not None:
+            return False
+        if not pushed and not word(x):
+            return False
+
+        names = set()
+        x.access(ctx, names, set())
+        if names & written:
+            return False
+        return not dereferences(x) or (runs and not memory)
+
+    #x with its invariant subtrees replaced, but not x itself if it is
+    #written to as a whole. runs if every entry into the loop runs it,
+    #pushed if x is the right operand of an operator, which wraps it
+    def replace(x, runs, whole=False, pushed=False):
+        if x.kind != 'op' or type(x.left) is not expr.node or type(x.right) is not expr.node:
+            return x
+        if not whole and invariant(x, runs, pushed):
+            for name, y in temps:
+                if x == y:
+                    return expr.node('var', name)
+            name = f"hoisted.{first + len(temps)}"
+            temps.append((name, x))
+            return expr.node('var', name)
+
+        left = x.content in expr.writing
+        if not (left and x.left.kind == 'var'):
+            x.left = replace(x.left, runs, left)
+        x.right = replace(x.right, runs, pushed=x.content != sym.op_assign)
+        return x
+
+    for at, stmt in enumerate(stmts):
+        for name, x, whole in list(expressions(stmt)):
+            setattr(stmt, name, replace(x, at < sure, whole))
+
+    return temps
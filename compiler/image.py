@@ -0,0 +1,114 @@
+
+import struct
+
+import emission
+import error
+
+
+#binary build format, all little endian.
+#the vm reads it back in vm.load_image, keep both in sync.
+#
+#   header   magic, version, flags, entry, count, section offsets
+#   names    opcode names, u8 length + utf8. opcodes index this table
+#   ops      u16 opcode per instruction
+#   kinds    u8 operand kind per instruction
+#   args     i64 operand per instruction
+#   strings  u32 length + utf8, indexed by string operands
+#   symbols  u8 kind, u32 address, u16 length + name, u16 length + scope
+#
+#names, ops, kinds and args are aligned to 8 bytes so the columns
+#can be viewed straight out of a memory map.
+
+magic   = b'SNUG'
+version = 1
+
+header = struct.Struct('<4sHHII6I')
+
+kind_none   = 0
+kind_int    = 1
+kind_string = 2
+
+symbol_routine = 0
+symbol_label   = 1
+
+int_min = -(1 << 63)
+int_max =  (1 << 63) - 1
+
+
+def align(buf):
+    buf += bytes(-len(buf) % 8)
+
+
+def pack_str(fmt, text):
+    raw = text.encode()
+    return struct.pack(fmt, len(raw)) + raw
+
+
+#expects an assembled output (link header in place)
+def encode(output, entry_origin):
+    cmds = [x for x in output.seq if type(x) is emission.command]
+
+    names   = {}
+    strings = {}
+    ops     = []
+    kinds   = []
+    args    = []
+
+    for cmd in cmds:
+        ops.append(names.setdefault(cmd.inst, len(names)))
+
+        arg = cmd.arg
+        if type(arg) is emission.reference:
+            arg = int(str(arg))
+
+        match arg:
+            case None:
+                kinds.append(kind_none)
+                args.append(0)
+            case int():
+                if not int_min <= arg <= int_max:
+                    error.error(f"Operand {arg} of '{cmd.inst}' does not fit into 64 bits")
+                kinds.append(kind_int)
+                args.append(arg)
+            case _:
+                kinds.append(kind_string)
+                args.append(strings.setdefault(str(arg), len(strings)))
+
+    buf = bytearray(header.size)
+    offsets = []
+
+    offsets.append(len(buf))
+    for name in names:
+        buf += pack_str('<B', name)
+    align(buf)
+
+    offsets.append(len(buf))
+    buf += struct.pack(f'<{len(ops)}H', *ops)
+    align(buf)
+
+    offsets.append(len(buf))
+    buf += struct.pack(f'<{len(kinds)}B', *kinds)
+    align(buf)
+
+    offsets.append(len(buf))
+    buf += struct.pack(f'<{len(args)}q', *args)
+
+    offsets.append(len(buf))
+    for text in strings:
+        buf += pack_str('<I', text)
+
+    offsets.append(len(buf))
+    for name, addr in output.routine_mapper.items():
+        buf += struct.pack('<BI', symbol_routine, addr)
+        buf += pack_str('<H', name) + pack_str('<H', '')
+    for (name, routine), addr in output.definition_mapper.items():
+        buf += struct.pack('<BI', symbol_label, addr)
+        buf += pack_str('<H', str(name)) + pack_str('<H', routine)
+
+    header.pack_into(buf, 0,
+        magic, version, 0,
+        entry_origin, len(ops),
+        *offsets
+    )
+
+    return bytes(buf)
@@ -0,0 +1,91 @@
+import copy
+import itertools
+import dataclasses
+
+import objs
+import expr
+import tree
+
+
+#sub statements to small routines are replaced by the routine's body.
+#arguments and results go over the data stack either way, so the body
+#runs as it is once its variables and labels are renamed into the caller
+#and constants are replaced by their values
+
+#statements a routine may not hold to be inlined: deferred ones run at
+#its end and trans memory is only given back at its return
+blocking = (objs._defer, objs._trans)
+
+
+#routine name resolves to if a call to it may be inlined, None otherwise.
+#only leaves, which call no routine that could be inlined in turn: that
+#keeps the growth of the caller to a single body per call site, and
+#leaves are never recursive
+def candidate(name, scope, threshold, intrinsics):
+    routine = scope.routines.get(name)
+    if routine is None or len(routine.sapling) > threshold:
+        return None
+    if name in scope.intrinsics and not intrinsics:
+        return None
+    if any(type(x) in blocking for x in routine.sapling):
+        return None
+    if any(intrinsics or callee not in scope.intrinsics for callee in routine.callees()):
+        return None
+    return routine
+
+
+#variables of routine, as infer finds them
+def variables(routine, scope):
+    ctx = objs._rout._ctx(vars={}, var_allocer=itertools.count(), tree=scope, routine=routine)
+    routine.sapling.infer(ctx)
+    return ctx.vars
+
+
+#copy of the body of routine for call site prefix, None if it uses a name
+#that is neither one of its variables nor a constant
+def body(routine, scope, prefix):
+    names = variables(routine, scope)
+    stmts = copy.deepcopy(routine.sapling.subs)
+
+    def rename(x):
+        if x.kind == 'var':
+            if x.content in names:
+                x.content = prefix + x.content
+            elif x.content in scope.consts:
+                x.kind, x.content = 'num', scope.consts[x.content]
+            else:
+                return False
+        if x.kind == 'op' and type(x.left) is expr.node and type(x.right) is expr.node:
+            return rename(x.left) and rename(x.right)
+        return True
+
+    for stmt in stmts:
+        if type(stmt) in (objs._lab, objs._jump):
+            stmt.label = prefix + str(stmt.label)
+
+        for f in dataclasses.fields(stmt):
+            x = getattr(stmt, f.name)
+            if type(x) is expr.node and not rename(x):
+                return None
+
+    return stmts
+
+
+#routine with calls of at most threshold statements long routines in
+#scope expanded, or routine itself if there are none. the copy keeps the
+#shared parsed tree as it is. intrinsics are kept as calls unless asked
+#for, the vm runs them natively
+def expand(routine, scope, threshold, intrinsics=False):
+    sites = itertools.count()
+    stmts = []
+    for stmt in routine.sapling.subs:
+        callee = None
+        if type(stmt) is objs._sub:
+            callee = candidate(stmt.target, scope, threshold, intrinsics)
+
+        inlined = callee and body(callee, scope, f"{callee.name}.{next(sites)}.")
+        stmts.extend(inlined or [stmt])
+
+    if next(sites) == 0:
+        return routine
+    return objs._rout(name=routine.name, sapling=tree.node(subs=stmts))
@@ -1,4 +1,6 @@
 
+import re
+import typing
 from dataclasses import dataclass
 from dataclasses import field
 
@@ -6,7 +8,7 @@ import error
 
 
 
-@dataclass
+@dataclass(slots=True)
 class token:
     content : str = ""
     line    : int = 0
@@ -18,44 +20,95 @@ class token:
 
 
 
-def get_kind(char):
-    match char:
-        case '"':               return 'comment'
-        case x if x.isdigit():  return 'numb'
-        case x if x.isalpha():  return 'iden' 
-        case ":"             :  return 'iden' #for scoping
-        case "_"             :  return 'iden' #for naming
-        case ';':               return 'eos'
-        case ',':               return 'delim'
-        case '\n':              return 'newline'
-        case ' ':               return 'space'
-        case "'":               return 'quote' #string delim
-        case "(":               return 'open_paran'
-        case ")":               return 'close_paran'
-        case "{":               return 'open_scope'
-        case "}":               return 'close_scope'
-        case _:                 return 'symbol'
+#a token is a run of characters of the same kind:
+#   numb         digits
+#   iden         letters, ':' (for scoping) and '_' (for naming)
+#   eos, delim   ';' and ','
+#   paran/scope  '(' ')' '{' '}'
+#   symbol       anything else, so '>=' or '=+' are one token
+#strings are quoted with ' (adjacent ones join), comments run from '"'
+#to the end of the line. a string still open at the end of a line
+#matches open_quote and continues on the next one
+scanner = re.compile(r"""
+      (?P<newline>     \n)
+    | (?P<space>       \ +)
+    | (?P<comment>     "[^\n]*)
+    | (?P<quote>       (?:'[^']*')+)
+    | (?P<open_quote>  '[^']*$)
+    | (?P<numb>        \d+)
+    | (?P<iden>        (?:[^\W\d_]|[:_])+)
+    | (?P<eos>         ;+)
+    | (?P<delim>       ,+)
+    | (?P<open_paran>  \(+)
+    | (?P<close_paran> \)+)
+    | (?P<open_scope>  \{+)
+    | (?P<close_scope> \}+)
+    | (?P<symbol>      [^\w:;,\n\ '"(){}]+)
+""", re.VERBOSE)
+
+skipped = ('newline', 'space', 'comment')
+
+
+#tokens of the file at path, read and produced one line at a time
+def tokens(path):
+    with open(path, "r") as f:
+        carry = "" #string running over the end of the line
+
+        for line, text in enumerate(f, 1):
+            text = carry + text
+            carry = ""
+
+            for match in scanner.finditer(text):
+                kind = match.lastgroup
+
+                if kind in skipped:
+                    continue
+                if kind == 'open_quote':
+                    carry = match.group()
+                    continue
+
+                content = match.group()
+                if kind == 'quote':
+                    content = content.replace("'", "")
 
+                yield token(content, line, path, kind)
 
+        if carry:
+            yield token(carry.replace("'", ""), line, path, 'quote')
+
+
+#cursor over a token iterator, with one token of lookahead
 @dataclass
 class stream:
-    token_buffer : list[token]
+    tokens : typing.Iterator[token]
 
     #in case something goes wrong, this token is responsible
     last_token : token = field(default_factory=token)
 
+    ahead : token | None = None
+
+    def __post_init__(self):
+        self.tokens = iter(self.tokens)
+        self.ahead = next(self.tokens, None)
+
     def _pop(self):
-        return self.token_buffer.pop(0)
+        popped = self.ahead
+        if popped is None:
+            raise IndexError("pop from empty token stream")
+        self.ahead = next(self.tokens, None)
+        return popped
 
     def pop(self) -> str:
         self.last_token = self._pop()
         return self.last_token.content
 
     def peek(self) -> str:
-        return self.token_buffer[0].content
+        return self.peek_raw().content
 
     def peek_raw(self):
-        return self.token_buffer[0]
+        if self.ahead is None:
+            raise IndexError("peek into empty token stream")
+        return self.ahead
 
     def pop_raw(self):
         self.last_token = self._pop()
@@ -65,59 +118,17 @@ class stream:
         token = self._pop()
         if content != str(token):
             error.path_line_error(
-                self.last_token.path, 
-                self.last_token.line, 
+                self.last_token.path,
+                self.last_token.line,
                 f"Expected '{content}' but got '{token}'"
             )
 
     def has(self):
-        return len(self.token_buffer) > 0
+        return self.ahead is not None
 
     def maybe(self, content):
         if self.peek() == content:
             self.pop()
 
 def tokenize(path):
-    with open(path, "r") as f:
-        raw = f.read()
-
-    token_buffer = []
-    buffer = []
-    kind_old = None
-    line = 1
-
-    #modes
-    comment  = False
-    string   = False
-    char_lit = False
-
-    for char in raw:
-        kind_new = get_kind(char)
-
-        if kind_old == 'quote': string = not string
-
-        if kind_new == 'comment': comment = True
-        if kind_new == 'newline': comment = False
-        if comment: continue
-
-        if char_lit: kind_new = 'char_lit'
-        if char_lit: char_lit = False
-        if kind_new == 'backtick': char_lit = True
-
-
-        if kind_new != kind_old and not string:
-            token_content = "".join(buffer)
-            buffer = []
-
-            if kind_old not in ('space', 'newline', 'backtick', None):
-                token_buffer.append(token(
-                    token_content, line, path, kind_old
-                ))
-
-        if kind_new != 'quote':
-            buffer.append(char)
-        kind_old = kind_new
-        if char == '\n': line += 1
-
-    return stream(token_buffer)
-
+    return stream(tokens(path))
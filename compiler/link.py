@@ -0,0 +1,407 @@
+#!/usr/bin/python3
+
+import os
+import struct
+import hashlib
+import argparse
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclasses import field
+
+import tree
+import objs
+import emission
+import peephole
+import inline
+import hoist
+import image
+import error
+
+
+#operand resolved when linking: the address of routine name plus offset,
+#or for local labels (name None) of the routine it is in plus offset
+@dataclass
+class reloc:
+    name   : str | None
+    offset : int = 0
+
+#routine of an object, addresses relative to its first instruction
+@dataclass
+class routine:
+    name   : str
+    items  : list[emission.command | emission.anno]
+    labels : dict[str, int]
+    size   : int #instructions
+
+    #routines referred to, in the order of the code
+    def callees(self):
+        for item in self.items:
+            if type(item) is emission.command and type(item.arg) is reloc and item.arg.name is not None:
+                yield item.arg.name
+
+#relocatable object of one module. routines are all exported,
+#externals are the names it refers to but does not define
+@dataclass
+class unit:
+    path      : str
+    routines  : list[routine] = field(default_factory=lambda: [])
+    externals : list[str]     = field(default_factory=lambda: [])
+
+
+
+#object file format, all little endian:
+#
+#   header    magic, version, routine count, external count
+#   routine   name, u32 item count, u32 label count
+#             labels   name, u32 offset
+#             items    u8 kind, then an annotation text or a command:
+#                      opcode name, u8 operand kind, operand
+#   externals name
+#
+#operands are nothing, an i64, a string, or a reloc (name, '' for local
+#labels, and i64 offset). texts are u32 length + utf8
+
+magic   = b'SNOB'
+version = 1
+
+header = struct.Struct('<4sHII')
+
+item_anno    = 0
+item_command = 1
+
+kind_reloc = 3
+
+
+def pack_text(buf, text):
+    raw = text.encode()
+    buf += struct.pack('<I', len(raw))
+    buf += raw
+
+def encode(obj):
+    buf = bytearray(header.pack(magic, version, len(obj.routines), len(obj.externals)))
+
+    for r in obj.routines:
+        pack_text(buf, r.name)
+        buf += struct.pack('<II', len(r.items), len(r.labels))
+
+        for name, offset in r.labels.items():
+            pack_text(buf, name)
+            buf += struct.pack('<I', offset)
+
+        for item in r.items:
+            if type(item) is emission.anno:
+                buf += struct.pack('<B', item_anno)
+                pack_text(buf, item.msg)
+                continue
+
+            buf += struct.pack('<B', item_command)
+            pack_text(buf, item.inst)
+
+            match item.arg:
+                case None:
+                    buf += struct.pack('<B', image.kind_none)
+                case reloc():
+                    buf += struct.pack('<B', kind_reloc)
+                    pack_text(buf, item.arg.name or '')
+                    buf += struct.pack('<q', item.arg.offset)
+                case int():
+                    if not image.int_min <= item.arg <= image.int_max:
+                        error.error(f"Operand {item.arg} of '{item.inst}' does not fit into 64 bits")
+                    buf += struct.pack('<Bq', image.kind_int, item.arg)
+                case _:
+                    buf += struct.pack('<B', image.kind_string)
+                    pack_text(buf, str(item.arg))
+
+    for name in obj.externals:
+        pack_text(buf, name)
+
+    return bytes(buf)
+
+
+def decode(raw, path):
+    at = 0
+    def take(fmt):
+        nonlocal at
+        values = struct.unpack_from(fmt, raw, at)
+        at += struct.calcsize(fmt)
+        return values
+
+    def text():
+        nonlocal at
+        (size,) = take('<I')
+        at += size
+        return raw[at - size : at].decode()
+
+    tag, ver, routine_count, external_count = take(header.format)
+    if tag != magic or ver != version:
+        error.error(f"{path} is not an object file of version {version}")
+
+    obj = unit(path)
+    for _ in range(routine_count):
+        name = text()
+        item_count, label_count = take('<II')
+
+        labels = {}
+        for _ in range(label_count):
+            label = text()
+            (labels[label],) = take('<I')
+
+        items = []
+        size = 0
+        for _ in range(item_count):
+            (kind,) = take('<B')
+            if kind == item_anno:
+                items.append(emission.anno(text()))
+                continue
+
+            inst = text()
+            (kind,) = take('<B')
+            match kind:
+                case image.kind_none:
+                    arg = None
+                case image.kind_int:
+                    (arg,) = take('<q')
+                case image.kind_string:
+                    arg = text()
+                case _:
+                    target = text() or None
+                    (offset,) = take('<q')
+                    arg = reloc(target, offset)
+
+            items.append(emission.command(inst, arg))
+            size += 1
+
+        obj.routines.append(routine(name, items, labels, size))
+
+    obj.externals = [text() for _ in range(external_count)]
+    return obj
+
+
+
+#object of the module at path, with the modules it uses in scope.
+#its routines are emitted one by one into an output of their own,
+#options are the switches of emission.output
+def compile(path, modules, options={}, scope=None):
+    if scope is None:
+        scope = tree.prepare(path, modules)
+    obj = unit(path)
+
+    defined = set()
+    for sub in modules.module(path).subs:
+        if type(sub) is not objs._rout or sub.name in defined:
+            continue
+        defined.add(sub.name)
+
+        output = emission.output(**options)
+        expanded = sub
+        if output.inline:
+            expanded = inline.expand(sub, scope, output.inline, output.inline_intrinsics)
+
+        hoisted = []
+        if output.hoist:
+            expanded, hoisted = hoist.expand(expanded, scope)
+
+        expanded.emit(output, scope)
+        for x in hoisted:
+            output.annotate(f'"\thoisted {x}')
+        peephole.optimize(output)
+
+        base = output.link_header_size
+        items = output.seq[output.link_header_size:]
+        for item in items:
+            if type(item) is emission.command and type(item.arg) is emission.reference:
+                ref = item.arg
+                item.arg = (
+                    reloc(ref.name) if ref.entry else
+                    reloc(None, output.lookup_local_label(ref.name, ref.routine) - base)
+                )
+
+        labels = {str(name): addr - base for (name, _), addr in output.definition_mapper.items()}
+        obj.routines.append(routine(sub.name, items, labels, output.addr))
+
+    for r in obj.routines:
+        for name in r.callees():
+            if name not in defined:
+                defined.add(name)
+                obj.externals.append(name)
+
+    return obj
+
+
+#objects are only valid for the compiler that made them
+_version = None
+def compiler_version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in sorted(os.listdir(here)):
+            if name.endswith('.py'):
+                with open(os.path.join(here, name), 'rb') as f:
+                    h.update(f.read())
+        _version = h.digest()
+    return _version
+
+#object of the module at path, compiled unless the directory of modules
+#has one made from the same sources: the module, everything it uses and
+#the constants and intrinsics of program. those are global like they are
+#to the whole program tree (see tree.node.inject), so a module sees the
+#ones of modules using it. without program, only the ones it uses
+def build(path, modules, options={}, program=None):
+    scope = tree.prepare(path, modules)
+    if program is not None:
+        scope.consts = dict(program.consts)
+        scope.intrinsics = set(program.intrinsics)
+
+    key = hashlib.sha256(compiler_version())
+    key.update(repr(sorted(options.items())).encode())
+    for resolved in scope.modules:
+        key.update(resolved.encode())
+        key.update(modules.digest(resolved))
+    key.update(repr(sorted(scope.consts.items())).encode())
+    key.update(repr(sorted(scope.intrinsics)).encode())
+    stored = modules.stored(key)
+
+    if stored is not None and os.path.exists(stored):
+        modules.stats['linked'] += 1
+        with open(stored, 'rb') as f:
+            return decode(f.read(), path)
+
+    modules.stats['compiled'] += 1
+    obj = compile(path, modules, options, scope)
+
+    if stored is not None:
+        modules.save(stored, encode(obj))
+    return obj
+
+
+#per worker state of build_all, set up once by build_load()
+builder = {}
+
+def build_load(modules, program):
+    builder['modules'] = modules
+    builder['program'] = program
+
+#build in a worker, returns the object and the stats of building it
+def build_run(path, options):
+    modules = builder['modules']
+    modules.stats = dict.fromkeys(modules.stats, 0)
+    return build(path, modules, options, builder['program']), modules.stats
+
+#objects of the modules at paths of program, in their order, built on jobs
+#processes. workers are forked, so they start out with the trees modules
+#has parsed already (see tree.cache.preload). objects do not depend on
+#each other
+def build_all(paths, modules, options={}, jobs=None, program=None):
+    jobs = jobs or os.cpu_count() or 1
+    if jobs == 1 or len(paths) < 2:
+        return [build(path, modules, options, program) for path in paths]
+
+    pool = ProcessPoolExecutor(
+        max_workers = min(jobs, len(paths)),
+        mp_context = multiprocessing.get_context('fork'),
+        initializer = build_load,
+        initargs = (modules, program),
+    )
+    with pool:
+        built = list(pool.map(build_run, paths, [options] * len(paths)))
+
+    for _, stats in built:
+        for k in stats:
+            modules.stats[k] += stats[k]
+    return [obj for obj, _ in built]
+
+
+
+#routines reachable from entry, depth first in call order, like
+#objs._rout.generate. the first object to define a name wins
+def reachable(objects, entry):
+    symbols = {}
+    for obj in objects:
+        for r in obj.routines:
+            symbols.setdefault(r.name, r)
+
+    order = []
+    seen = set()
+    work = [entry]
+    while work:
+        name = work.pop()
+        if name in seen:
+            continue
+        seen.add(name)
+
+        if name not in symbols:
+            error.error(f"Unable to resolve routine name: {name}")
+        r = symbols[name]
+
+        order.append(r)
+        work.extend(reversed(list(r.callees())))
+
+    return order
+
+#combine objects into an output, ready to assemble.
+#one pass lays out the routines, a second one copies and relocates them
+def link(objects, entry='main'):
+    order = reachable(objects, entry)
+    output = emission.output()
+
+    base = {}
+    addr = output.address()
+    for r in order:
+        base[r.name] = addr
+        addr += r.size
+
+    for r in order:
+        output.define_routine(r.name)
+        for label, offset in r.labels.items():
+            output.definition_mapper[(label, r.name)] = base[r.name] + offset
+
+        for item in r.items:
+            if type(item) is emission.anno:
+                output.seq.append(item)
+                continue
+
+            arg = item.arg
+            if type(arg) is reloc:
+                arg = base[arg.name or r.name] + arg.offset
+            output(item.inst, arg)
+
+    return output
+
+
+#assemble output and write it to target
+def write(output, target, text, entry):
+    entry_origin = output.lookup_routine(entry)
+    build = output.assemble(entry_origin)
+
+    if text:
+        with open(target, "w") as f:
+            f.write(build)
+        return
+
+    with open(target, "wb") as f:
+        f.write(image.encode(output, entry_origin))
+
+
+
+def main():
+    parser = argparse.ArgumentParser(description='link object files into a build')
+    parser.add_argument('objects', nargs='+')
+    parser.add_argument('-o', dest='target', default='build')
+    parser.add_argument('--entry', default='main')
+    parser.add_argument('--text', action='store_true',
+        help='write the textual build instead of the binary image')
+    args = parser.parse_args()
+
+    objects = []
+    for path in args.objects:
+        with open(path, 'rb') as f:
+            objects.append(decode(f.read(), path))
+
+    output = link(objects, args.entry)
+    write(output, args.target, args.text, args.entry)
+
+
+if __name__ == "__main__":
+    main()
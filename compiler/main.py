@@ -1,35 +1,186 @@
 #!/usr/bin/python3
 
+import os
 import sys
+import argparse
 import tree
+import link
 import emission
-import error
+import peephole
 
 
 entry_name = "main"
 
-def compile(path):
+#instruction sets, by the number of registers expressions may use
+isas = {
+    'acc': 0, #accumulator and data stack
+    'reg': 8, #three address register instructions, needs the decoded vm engine
+}
+
+#parsed trees and objects of modules, kept between builds
+cache_dir = '.snugcache'
+
+#every module of the program is compiled to an object on its own, or
+#taken from the cache if it and what it uses did not change, then linked.
+#modules are parsed and compiled on jobs processes, all cores for None.
+#options are the switches of emission.output, returns the linked output
+def compile(path, target='build', text=False, isa='acc', modules=None, jobs=1, **options):
+    if modules is None:
+        modules = tree.cache()
+    options['registers'] = isas[isa]
+
     #lex, parse, expand imports
-    root = tree.prepare(path)
+    if jobs != 1:
+        modules.preload(path, jobs)
+    root = tree.prepare(path, modules)
+
+    objects = link.build_all(list(root.modules.values()), modules, options, jobs, root)
+
+    output = link.link(objects, entry_name)
+    link.write(output, target, text, entry_name)
+    return output
+
+
+#expressions noted as '"\t<kind> <expr>' annotations, per routine
+def report_exprs(output, kind, unit):
+    routine = None
+    found = {}
+    for item in output.seq:
+        if type(item) is not emission.anno:
+            continue
+        if item.msg.startswith('"rout '):
+            routine = item.msg.split(' ', 1)[1]
+        if item.msg.startswith(f'"\t{kind} '):
+            found.setdefault(routine, []).append(item.msg.split(' ', 1)[1])
 
-    #output buffer
-    output = emission.output()
+    print(f"{kind:12} {unit:>5}", file=sys.stderr)
+    for routine, exprs in found.items():
+        print(f"{routine:12} {len(exprs):5}", file=sys.stderr)
+        for x in exprs:
+            print(f"    {x}", file=sys.stderr)
+    print(f"{'total':12} {sum(map(len, found.values())):5}", file=sys.stderr)
 
-    #actual compilation
-    entry = root.get_routine(entry_name)
-    entry.generate(output, root)
+#folds noted by expr.node.folded, per routine
+def report_folds(output):
+    report_exprs(output, 'folded', 'nodes')
 
-    #render ir
-    entry_origin = output.lookup_routine(entry_name)
-    build = output.assemble(entry_origin)
-    
-    with open('build', "w") as f:
-        f.write(build)
+#subtrees noted by link.compile from hoist.expand, per routine
+def report_hoists(output):
+    report_exprs(output, 'hoisted', 'exprs')
+
+#frame slots noted by objs._rout.emit, per routine
+def report_slots(output):
+    print("routine          vars  slots", file=sys.stderr)
+    total = [0, 0]
+    for item in output.seq:
+        if type(item) is not emission.anno:
+            continue
+        if item.msg.startswith('"rout '):
+            routine = item.msg.split(' ', 1)[1]
+        if item.msg.startswith('"\tslots: '):
+            slots, _, names, _ = item.msg.split(' ', 1)[1].split()
+            print(f"{routine:16} {names:>4}  {slots:>5}", file=sys.stderr)
+            total[0] += int(names)
+            total[1] += int(slots)
+    print(f"{'total':16} {total[0]:4}  {total[1]:5}", file=sys.stderr)
+
+#hits noted by peephole.optimize, per rule
+def report_peephole(output):
+    hits = {name: 0 for name in peephole.rules}
+    routines = {name: 0 for name in peephole.rules}
+    for item in output.seq:
+        if type(item) is not emission.anno or not item.msg.startswith('"\tpeephole '):
+            continue
+        for hit in item.msg.split(' ', 1)[1].split(', '):
+            name, n = hit.split()
+            hits[name] += int(n)
+            routines[name] += 1
+
+    print("peephole      hits  routines", file=sys.stderr)
+    for name in hits:
+        print(f"{name:12} {hits[name]:5}  {routines[name]:8}", file=sys.stderr)
+    print(f"{'total':12} {sum(hits.values()):5}", file=sys.stderr)
 
 
 
 def main():
-    compile(sys.argv[1])
+    parser = argparse.ArgumentParser()
+    parser.add_argument('path')
+    parser.add_argument('-o', dest='target', default='build')
+    parser.add_argument('--text', action='store_true',
+        help='write the textual build instead of the binary image')
+    parser.add_argument('-c', dest='object', action='store_true',
+        help='only compile path to an object file, see link.py')
+    parser.add_argument('--isa', choices=isas, default='acc',
+        help='instruction set expressions are generated for')
+    parser.add_argument('--no-tail', action='store_true',
+        help='keep calls before a routine epilogue as plain calls')
+    parser.add_argument('--no-fold', action='store_true',
+        help='compute expressions on constants at runtime')
+    parser.add_argument('--fold-report', action='store_true',
+        help='report folded expressions on stderr')
+    parser.add_argument('--inline', type=int, default=emission.output.inline, metavar='N',
+        help='inline calls to routines of at most N statements, 0 for none (default: %(default)s)')
+    parser.add_argument('--inline-intrinsics', action='store_true',
+        help='inline intrinsics as well, for engines without natives')
+    parser.add_argument('--no-hoist', action='store_true',
+        help='compute loop invariant expressions on every iteration')
+    parser.add_argument('--hoist-report', action='store_true',
+        help='report expressions hoisted out of loops on stderr')
+    parser.add_argument('--no-share-slots', action='store_true',
+        help='give every variable a frame slot of its own')
+    parser.add_argument('--slot-report', action='store_true',
+        help='report variables and frame slots per routine on stderr')
+    parser.add_argument('--peephole', metavar='RULES', type=lambda x: tuple(filter(None, x.split(','))),
+        help=f"comma separated peephole rules to run (default: all of {','.join(peephole.rules)})")
+    parser.add_argument('--no-peephole', action='store_true',
+        help='run no peephole rules')
+    parser.add_argument('--peephole-report', action='store_true',
+        help='report peephole rule hits on stderr')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), metavar='N',
+        help='processes modules are parsed and compiled on (default: %(default)s)')
+    parser.add_argument('--cache', default=cache_dir, metavar='DIR',
+        help=f'directory of parsed modules and objects (default: {cache_dir})')
+    parser.add_argument('--no-cache', action='store_true',
+        help='parse and compile every module, without reading or writing the cache')
+    parser.add_argument('--cache-stats', action='store_true',
+        help='print module and object cache hits and misses')
+    args = parser.parse_args()
+
+    rules = () if args.no_peephole else args.peephole
+    for name in rules or ():
+        if name not in peephole.rules:
+            parser.error(f"unknown peephole rule '{name}'")
+
+    modules = tree.cache(None if args.no_cache else args.cache)
+    options = dict(
+        tail_calls  = not args.no_tail,
+        fold        = not args.no_fold,
+        peephole    = rules,
+        share_slots = not args.no_share_slots,
+        inline      = args.inline,
+        inline_intrinsics = args.inline_intrinsics,
+        hoist       = not args.no_hoist,
+    )
+
+    if args.object:
+        options['registers'] = isas[args.isa]
+        obj = link.build(args.path, modules, options)
+        with open(args.target, 'wb') as f:
+            f.write(link.encode(obj))
+    else:
+        output = compile(args.path, args.target, args.text, args.isa, modules, args.jobs, **options)
+        if args.fold_report:
+            report_folds(output)
+        if args.hoist_report:
+            report_hoists(output)
+        if args.peephole_report:
+            report_peephole(output)
+        if args.slot_report:
+            report_slots(output)
+
+    if args.cache_stats:
+        print(f"modules: {modules.report()}", file=sys.stderr)
 
 
 if __name__ == "__main__":
@@ -1,6 +1,8 @@
 
 from dataclasses import dataclass
 from dataclasses import field
+import dataclasses
+import itertools
 import os
 import typing
 
@@ -22,8 +24,132 @@ class _debug:
         self.target.generate(output, ctx)
         output('debug')
 
+#channel operand of the i/o statements, a number or a constant
+def resolve_channel(chan, ctx):
+    if chan.isdigit():
+        return int(chan)
+    if chan in ctx.tree.consts:
+        return ctx.tree.consts[chan]
+    error.error(f"Channel has to be a number or constant, got '{chan}'")
+
+@dataclass
+class _write:
+    chan  : str
+    value : expr.node
+
+    @classmethod
+    def parse(cls, stream):
+        chan = stream.pop()
+        stream.expect(sym.binding)
+        return cls(chan, expr.parse(stream))
+
+    def generate(self, output, ctx):
+        self.value.generate(output, ctx)
+        output('write', resolve_channel(self.chan, ctx))
+
+@dataclass
+class _read:
+    targets = ('target',) #written, see access
+
+    chan   : str
+    target : expr.node
+
+    @classmethod
+    def parse(cls, stream):
+        chan = stream.pop()
+        stream.expect(sym.binding)
+        return cls(chan, expr.parse(stream))
+
+    def infer(self, ctx):
+        self.target.infer(ctx)
+
+    def generate(self, output, ctx):
+        output('read', resolve_channel(self.chan, ctx))
+        self.target.write(output, ctx)
+
+#bulk write of a memory range
+@dataclass
+class _send:
+    chan : str
+    ptr  : expr.node
+    size : expr.node
+
+    @classmethod
+    def parse(cls, stream):
+        chan = stream.pop()
+        stream.expect(sym.binding)
+        ptr = expr.parse(stream)
+        stream.expect(",")
+        size = expr.parse(stream)
+        return cls(chan, ptr, size)
+
+    def generate(self, output, ctx):
+        self.size.generate(output, ctx)
+        output('push')
+        self.ptr.generate(output, ctx)
+        output('send', resolve_channel(self.chan, ctx))
+
+#bulk read into a memory range, optionally storing the count read
+@dataclass
+class _recv:
+    targets = ('target',) #written, see access
+
+    chan   : str
+    ptr    : expr.node
+    size   : expr.node
+    target : expr.node | None
+
+    @classmethod
+    def parse(cls, stream):
+        chan = stream.pop()
+        stream.expect(sym.binding)
+        ptr = expr.parse(stream)
+        stream.expect(",")
+        size = expr.parse(stream)
+
+        target = None
+        if stream.peek() == sym.binding:
+            stream.expect(sym.binding)
+            target = expr.parse(stream)
+
+        return cls(chan, ptr, size, target)
+
+    def infer(self, ctx):
+        if self.target is not None:
+            self.target.infer(ctx)
+
+    def generate(self, output, ctx):
+        self.size.generate(output, ctx)
+        output('push')
+        self.ptr.generate(output, ctx)
+        output('recv', resolve_channel(self.chan, ctx))
+        if self.target is not None:
+            self.target.write(output, ctx)
+
+@dataclass
+class _flush:
+    chan : str
+
+    @classmethod
+    def parse(cls, stream):
+        return cls(stream.pop())
+
+    def generate(self, output, ctx):
+        output('flush', resolve_channel(self.chan, ctx))
+
+@dataclass
+class _snapshot:
+    @classmethod
+    def parse(cls, stream):
+        return cls()
+
+    def generate(self, output, ctx):
+        output('snapshot')
+
 @dataclass
 class _pull:
+    targets = ('target',) #written, see access
+
     target : expr.node
 
     @classmethod
@@ -62,9 +188,8 @@ class _use:
         return cls(path = path)
 
     #called by tree.node itself
-    def expand(self, root):
-        module_tree = tree.prepare(self.path)
-        root.inject(module_tree)
+    def expand(self, root, modules):
+        root.use(self.path, modules)
 
 
 
@@ -134,14 +259,61 @@ class _sub:
         target = stream.pop()
         return cls(target)
 
+    #the target may be in another module, it is resolved when linking
     def generate(self, output, ctx):
-        target_obj = ctx.tree.get_routine(self.target)
+        #intrinsics may run natively, the vm falls back to the routine
+        inst = 'ncall' if self.target in ctx.tree.intrinsics else 'call'
+
+        routine_reference = emission.reference(self.target, None, output, entry=True)
+        output(inst, routine_reference)
+
+#run a routine on a worker, pulling count arguments for it.
+#handle receives what join needs
+@dataclass
+class _spawn:
+    targets = ('handle',) #written, see access
+
+    target : str
+    count  : expr.node
+    handle : expr.node
 
-        routine_reference = emission.reference(target_obj.name, None, output, entry=True)
-        output('call', routine_reference)
+    @classmethod
+    def parse(cls, stream):
+        target = stream.pop()
+
+        count = expr.node('num', 0)
+        if stream.peek() == ",":
+            stream.expect(",")
+            count = expr.parse(stream)
+
+        stream.expect(sym.binding)
+        return cls(target, count, expr.parse(stream))
+
+    def infer(self, ctx):
+        self.handle.infer(ctx)
+
+    def generate(self, output, ctx):
+        self.count.generate(output, ctx)
+        output('spawn', emission.reference(self.target, None, output, entry=True))
+        self.handle.write(output, ctx)
+
+#wait for a spawned routine, pushing its results
+@dataclass
+class _join:
+    handle : expr.node
+
+    @classmethod
+    def parse(cls, stream):
+        return cls(expr.parse(stream))
+
+    def generate(self, output, ctx):
+        self.handle.generate(output, ctx)
+        output('join')
 
 @dataclass
 class _trans:
+    targets = ('target',) #written, see access
+
     size   : expr.node
     target : expr.node #expr has to be writeable
 
@@ -180,6 +352,30 @@ class _defer:
 
 
 
+#variables a statement reads and writes, and whether one of the writes
+#may come before one of the reads. fields named in targets are written
+#last, of the other expressions a single one is the whole statement
+def access(stmt, ctx):
+    reads, writes = set(), set()
+    targets = getattr(stmt, 'targets', ())
+
+    exprs = [
+        (f.name, getattr(stmt, f.name)) for f in dataclasses.fields(stmt)
+        if type(getattr(stmt, f.name)) is expr.node
+    ]
+    last = len([name for name, _ in exprs if name not in targets]) == 1
+
+    early = 0
+    for name, x in exprs:
+        if name in targets:
+            early += x.target(ctx, reads, writes)
+        else:
+            early += x.access(ctx, reads, writes, last)
+
+    return reads, writes, early > 0
+
+
+
 @dataclass
 class _rout:
     #parse
@@ -194,44 +390,59 @@ class _rout:
         tree : 'tree.node'
         routine : '_rout'
 
+        #register isa: registers below the floor hold live values
+        reg_floor : int = 1
+
         def allocate_variable(self, name):
             if name not in self.vars.keys():
                 self.vars[name] = next(self.var_allocer)
 
-    #collect and emit dependencies of routine (recursivly *the horror*)
-    def dependencies(self, output, tree):
-        def walk(sapling):
-            nonlocal output, tree
-            for node in sapling:
-                if type(node) is _sub:
-                    depend = tree.get_routine(node.target)
-                    depend.generate(output, tree)
+    #names of the routines called by this one, in the order of the calls
+    def callees(self):
+        for node in self.sapling:
+            if type(node) in (_sub, _spawn):
+                yield node.target
 
-        walk(self.sapling) 
+    #emit routine and everything it calls, depth first in call order.
+    #a worklist instead of recursion, so long call chains are no problem
+    def generate(self, output, tree):
+        work = [self]
+        while work:
+            routine = work.pop()
 
+            #make sure routine is only generated once
+            if output.check_routine_defined(routine.name):
+                continue
 
-    def generate(self, output, tree):
-        #make sure routine is only generated once
-        if output.check_routine_defined(self.name):
-            return
+            routine.emit(output, tree)
+            work.extend(tree.get_routine(name) for name in reversed(list(routine.callees())))
 
+
+    def emit(self, output, tree):
         output.define_routine(self.name)
 
         #build compilation context
         ctx = self._ctx(
             vars = {},
-            var_allocer = iter(range(16)),
+            var_allocer = itertools.count(),
             tree = tree,
             routine = self
         )
 
         #infer variables
         self.sapling.infer(ctx)
+        names = list(ctx.vars)
+
+        #variables that are never live at once share a slot
+        if output.share_slots:
+            ctx.vars = self.slots(ctx)
 
         #reserve local stack space for variables
-        var_count = next(ctx.var_allocer)
+        var_count = max(ctx.vars.values(), default=-1) + 1
+        first = len(output.seq)
         output.annotate(f'"rout {self.name}')
-        output.annotate(f'"\tvars: {list(ctx.vars)}')
+        output.annotate(f'"\tvars: {names}')
+        output.annotate(f'"\tslots: {var_count} for {len(names)} vars')
         output("alloc", var_count)
 
 
@@ -243,8 +454,79 @@ class _rout:
 
         output('return')
 
-        #resolve dependencies
-        self.dependencies(output, tree)
+        if output.tail_calls:
+            self.tail_calls(output, first)
+
+    #statements in the order they run in, deferred ones at the end
+    def statements(self):
+        body = [x for x in self.sapling if type(x) is not _defer]
+        return body + [x.obj for x in self.sapling if type(x) is _defer]
+
+    #frame slot of every variable in ctx.vars. a backwards liveness
+    #analysis over the statements, then variables get the lowest slot no
+    #variable they are live with at a write has, in the order of ctx.vars
+    def slots(self, ctx):
+        body = self.statements()
+        count = len(body)
+
+        labels = {x.label: at for at, x in enumerate(body) if type(x) is _lab}
+        def successors(at):
+            x = body[at]
+            if type(x) is _jump and x.label in labels:
+                if x.cond is None:
+                    return (labels[x.label],)
+                return (at + 1, labels[x.label])
+            return (at + 1,)
+        nexts = [[n for n in successors(at) if n < count] for at in range(count)]
+
+        reads, writes, early = zip(*(access(x, ctx) for x in body)) if body else ((), (), ())
+        live_in  = [set() for _ in range(count)]
+        live_out = [set() for _ in range(count)]
+
+        changed = True
+        while changed:
+            changed = False
+            for at in reversed(range(count)):
+                out = set().union(*(live_in[n] for n in nexts[at]))
+                into = reads[at] | (out - writes[at])
+                if out != live_out[at] or into != live_in[at]:
+                    live_out[at], live_in[at] = out, into
+                    changed = True
+
+        clash = {name: set() for name in ctx.vars}
+        def interfere(a, b):
+            if a != b:
+                clash[a].add(b)
+                clash[b].add(a)
+
+        #whatever is live at the start is there at once
+        for a, b in itertools.combinations(live_in[0] if body else (), 2):
+            interfere(a, b)
+
+        for at in range(count):
+            for w in writes[at]:
+                for v in live_out[at] | writes[at]:
+                    interfere(w, v)
+                if early[at]:
+                    for v in reads[at]:
+                        interfere(w, v)
+
+        slots = {}
+        for name in ctx.vars:
+            taken = {slots[x] for x in clash[name] if x in slots}
+            slots[name] = next(n for n in itertools.count() if n not in taken)
+        return slots
+
+    #a call right before the epilogue becomes tail, reusing the frame.
+    #not in routines with trans, the callee could get pointers into it
+    def tail_calls(self, output, first):
+        cmds = [x for x in output.seq[first:] if type(x) is emission.command]
+        if any(cmd.inst == 'trans' for cmd in cmds):
+            return
+
+        for cmd, after, last in zip(cmds, cmds[1:], cmds[2:]):
+            if (cmd.inst, after.inst, last.inst) == ('call', 'free', 'return'):
+                cmd.inst = 'tail'
 
 
 
@@ -299,6 +581,16 @@ class _seq:
         return consts
 
 
+#declares a routine as intrinsic, see _sub.generate
+@dataclass
+class _intrinsic:
+    name : str
+
+    @classmethod
+    def parse(cls, stream):
+        return cls(stream.pop())
+
+
 @dataclass
 class _const:
     name : str
@@ -0,0 +1,116 @@
+import emission
+
+
+#peephole rules over the commands of a routine. a rule looks at the
+#command at address at and returns the addresses of commands to delete,
+#or nothing. labels on a deleted command move to the next one, so a rule
+#only deletes commands that are no-ops wherever control comes from.
+#targets holds the addresses labels and routines point at
+
+#commands that leave the acc as it is
+keeps_acc = ('push', 'store', 'alloc', 'free', 'debug')
+
+#commands that leave a 64 bit int in the acc, which comes back from
+#memory as it went in. comparisons leave a bool, which array memory turns
+#into an int on the way through, and arithmetic may leave more than 64
+#bits, which array memory wraps around
+words = ('const', 'load', 'pull', 'deref', 'trans')
+
+#the acc holds a 64 bit int at the command at
+def word_acc(code, at, targets):
+    while at not in targets:
+        at -= 1
+        if code[at].inst in words:
+            return True
+        if code[at].inst not in keeps_acc:
+            return False
+    return False
+
+
+#store x; load x: the load gets back what is in the acc already
+def store_load(code, at, targets, output):
+    if at + 1 >= len(code) or at + 1 in targets:
+        return
+    store, load = code[at], code[at + 1]
+    if store.inst == 'store' and load.inst == 'load' and store.arg == load.arg and \
+            word_acc(code, at, targets):
+        return (at + 1,)
+
+#push; pull: the acc goes to the data stack and right back
+def push_pull(code, at, targets, output):
+    if at + 1 >= len(code) or at + 1 in targets:
+        return
+    if (code[at].inst, code[at + 1].inst) == ('push', 'pull') and word_acc(code, at, targets):
+        return (at, at + 1)
+
+#alloc 0 and free 0 of routines without variables
+def empty_frame(code, at, targets, output):
+    if code[at].inst in ('alloc', 'free') and code[at].arg == 0:
+        return (at,)
+
+#jump or branch to the command right after it
+def jump_next(code, at, targets, output):
+    cmd = code[at]
+    if cmd.inst not in ('jump', 'branch') or type(cmd.arg) is not emission.reference or cmd.arg.entry:
+        return
+    if output.lookup_local_label(cmd.arg.name, cmd.arg.routine) == at + 1:
+        return (at,)
+
+#free n; return: return resets the stack to the base anyway
+def free_return(code, at, targets, output):
+    if at + 1 < len(code) and (code[at].inst, code[at + 1].inst) == ('free', 'return'):
+        return (at,)
+
+
+rules = {
+    'store-load':  store_load,
+    'push-pull':   push_pull,
+    'empty-frame': empty_frame,
+    'jump-next':   jump_next,
+    'free-return': free_return,
+}
+
+
+#run the rules of output.peephole on everything after the link header
+#until none applies, moving labels and routines to match. link.compile
+#runs it on the output of each routine. hits are noted as an annotation
+def optimize(output):
+    names = rules if output.peephole is None else output.peephole
+    hits = {name: 0 for name in names}
+
+    while True:
+        #indexed by address
+        code = [x for x in output.seq if type(x) is emission.command]
+
+        targets = set(output.definition_mapper.values())
+        targets.update(output.routine_mapper.values())
+
+        dead = set()
+        for at in range(output.link_header_size, len(code)):
+            if at in dead:
+                continue
+            for name in names:
+                found = rules[name](code, at, targets, output)
+                if found:
+                    dead.update(found)
+                    hits[name] += 1
+                    break
+
+        if not dead:
+            break
+
+        #commands deleted before every address, so a deleted one maps to the next
+        moved = [0] * (len(code) + 1)
+        for at in range(len(code)):
+            moved[at + 1] = moved[at] + (at in dead)
+
+        for mapper in (output.definition_mapper, output.routine_mapper):
+            for key, addr in mapper.items():
+                mapper[key] = addr - moved[addr]
+
+        gone = {id(code[at]) for at in dead}
+        output.seq = [x for x in output.seq if id(x) not in gone]
+        output.addr -= len(dead)
+
+    if any(hits.values()):
+        output.annotate('"\tpeephole ' + ", ".join(f"{name} {n}" for name, n in hits.items() if n))
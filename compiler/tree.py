@@ -1,4 +1,9 @@
 
+import os
+import pickle
+import hashlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from dataclasses import dataclass
 from dataclasses import field
 
@@ -13,6 +18,13 @@ import lex
 class node:
     subs   : list['node'] = field(default_factory=lambda: [])
     consts : dict[str, int] = field(default_factory=lambda: {})
+    intrinsics : set[str] = field(default_factory=lambda: set())
+
+    #routines by name, see index
+    routines : dict[str, 'objs._rout'] = field(default_factory=lambda: {})
+
+    #paths of the modules injected into root by resolved path, in order
+    modules : dict[str, str] = field(default_factory=lambda: {})
 
     def __len__(self):
         return len(self.subs)
@@ -23,21 +35,36 @@ class node:
     def inject(self, other):
         self.subs += other.subs
         self.consts.update(other.consts)
+        self.intrinsics |= other.intrinsics
 
 
-    def expand(self):
+    #injected modules append to subs, so their uses are expanded here too
+    def expand(self, modules):
         for sub in self.subs:
             if type(sub) is objs._use:
-                sub.expand(self)
+                sub.expand(self, modules)
 
-    def get_routine(self, name) -> objs._rout:
+    #inject the module at path, unless it is already part of root
+    def use(self, path, modules):
+        resolved = os.path.realpath(path)
+        if resolved in self.modules:
+            return
+
+        self.modules[resolved] = path
+        self.inject(modules.module(path))
+
+    #only applies to root, after expand.
+    #the first routine of a name wins, as modules are injected after the root
+    def index(self):
+        self.routines = {}
         for sub in self.subs:
-            if sub is None: continue
-            if type(sub) is not objs._rout: continue
-            if sub.name == name:
-                return sub
+            if type(sub) is objs._rout:
+                self.routines.setdefault(sub.name, sub)
 
-        error.error(f"Unable to resolve routine name: {name}")
+    def get_routine(self, name) -> objs._rout:
+        if name not in self.routines:
+            error.error(f"Unable to resolve routine name: {name}")
+        return self.routines[name]
 
 
 
@@ -49,6 +76,8 @@ class node:
             t = type(sub)
             if t is objs._seq or t is objs._const:
                 self.consts.update(sub.render_constants())
+            if t is objs._intrinsic:
+                self.intrinsics.add(sub.name)
 
 
 
@@ -72,13 +101,155 @@ def parse(stream):
 
 
 
-#lex, parse, expand imports
-def prepare(path):
+#parsed modules by resolved path, so every module is parsed once however
+#many times and by how many modules it is used. with a directory, parsed
+#trees are also kept on disk, keyed by path, content and compiler.
+#trees handed out are shared, inject them instead of changing them
+@dataclass
+class cache:
+    directory : str | None = None
+    trees     : dict[str, node] = field(default_factory=lambda: {})
+    parsed    : dict[str, node] = field(default_factory=lambda: {}) #by preload, not handed out yet
+    digests   : dict[str, bytes] = field(default_factory=lambda: {})
+    stats     : dict[str, int]  = field(default_factory=lambda: {
+        'hit':      0, #already parsed in this run
+        'disk':     0, #loaded from the directory
+        'miss':     0, #lexed and parsed
+        'linked':   0, #objects loaded from the directory, see link.build
+        'compiled': 0, #objects compiled
+    })
+
+    def module(self, path) -> node:
+        resolved = os.path.realpath(path)
+        if resolved in self.trees:
+            self.stats['hit'] += 1
+            return self.trees[resolved]
+
+        if resolved in self.parsed:
+            root = self.parsed.pop(resolved)
+        else:
+            root = self.load(path)
+
+        self.trees[resolved] = root
+        return root
+
+    #parse the module at path and everything it uses ahead of prepare, on
+    #jobs processes. the use graph is resolved a breadth at a time, the
+    #modules of a breadth do not depend on each other. trees come out the
+    #same as parsed one by one, prepare still injects them in its order
+    def preload(self, path, jobs=None):
+        jobs = jobs or os.cpu_count() or 1
+        seen = set()
+        breadth = [path]
+
+        with ProcessPoolExecutor(max_workers=jobs, mp_context=multiprocessing.get_context('fork')) as pool:
+            while breadth:
+                todo = {}
+                for p in breadth:
+                    resolved = os.path.realpath(p)
+                    if resolved not in seen:
+                        seen.add(resolved)
+                        todo[resolved] = p
+
+                fresh = [r for r in todo if r not in self.trees and r not in self.parsed]
+                if len(fresh) == 1:
+                    self.parsed[fresh[0]] = self.load(todo[fresh[0]])
+                elif fresh:
+                    paths = [todo[r] for r in fresh]
+                    for resolved, (root, stats, digest) in zip(fresh, pool.map(parse_run, [self.directory] * len(paths), paths)):
+                        self.parsed[resolved] = root
+                        self.digests[resolved] = digest
+                        for k in stats:
+                            self.stats[k] += stats[k]
+
+                breadth = [
+                    sub.path for r in todo
+                    for sub in (self.trees.get(r) or self.parsed[r]).subs
+                    if type(sub) is objs._use
+                ]
+
+    #content hash of the file at path
+    def digest(self, path):
+        resolved = os.path.realpath(path)
+        if resolved not in self.digests:
+            with open(path, 'rb') as f:
+                self.digests[resolved] = hashlib.sha256(f.read()).digest()
+        return self.digests[resolved]
+
+    #file in the directory for key, None without a directory
+    def stored(self, key):
+        if self.directory is None:
+            return None
+        return os.path.join(self.directory, key.hexdigest())
+
+    def save(self, stored, raw):
+        os.makedirs(self.directory, exist_ok=True)
+        temporary = f"{stored}.{os.getpid()}.tmp" #workers may save at once
+        with open(temporary, 'wb') as f:
+            f.write(raw)
+        os.replace(temporary, stored)
+
+    def load(self, path):
+        key = hashlib.sha256(self.digest(path))
+        key.update(os.path.realpath(path).encode())
+        key.update(version())
+        stored = self.stored(key)
+
+        if stored is not None and os.path.exists(stored):
+            self.stats['disk'] += 1
+            with open(stored, 'rb') as f:
+                return pickle.load(f)
+
+        self.stats['miss'] += 1
+        root = read(path)
+
+        if stored is not None:
+            self.save(stored, pickle.dumps(root))
+        return root
+
+    def report(self):
+        return ", ".join(f"{n} {k}" for k, n in self.stats.items())
+
+
+#parse the module at path in a worker of cache.preload, returns the tree,
+#the stats of parsing it and the digest of the file
+def parse_run(directory, path):
+    modules = cache(directory)
+    root = modules.load(path)
+    return root, modules.stats, modules.digest(path)
+
+
+#stored trees are only valid for the parser that made them
+_version = None
+def version():
+    global _version
+    if _version is None:
+        h = hashlib.sha256()
+        here = os.path.dirname(os.path.abspath(__file__))
+        for name in ('lex.py', 'sym.py', 'expr.py', 'objs.py', 'tree.py'):
+            with open(os.path.join(here, name), 'rb') as f:
+                h.update(f.read())
+        _version = h.digest()
+    return _version
+
+
+
+#lex, parse
+def read(path):
     stream = lex.tokenize(path)
     root = parse(stream)
 
     root.render_constants()
-    root.expand()
+    return root
 
+#lex, parse, expand imports
+def prepare(path, modules=None):
+    if modules is None:
+        modules = cache()
+
+    root = node()
+    root.use(path, modules)
+    root.expand(modules)
+    root.index()
 
     return root
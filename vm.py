@@ -1,6 +1,26 @@
 #!/usr/bin/python3
 
 import sys
+import time
+import argparse
+import asyncio
+import collections
+import gc
+import ctypes
+import hashlib
+import mmap
+import multiprocessing
+import operator
+import os
+import random
+import traceback
+import struct
+import typing
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from multiprocessing import shared_memory
+from array import array
+from dataclasses import dataclass
+from dataclasses import field
 
 
 
@@ -25,10 +45,161 @@ def lex(raw):
 
 
 
-def run(prog):
+#binary build image, written by compiler/image.py (see there for the layout)
+image_magic   = b'SNUG'
+image_version = 1
+image_header  = struct.Struct('<4sHHII6I')
 
-    mem_size = 65536
+kind_none = 0
+kind_int  = 1
 
+@dataclass
+class image:
+    entry    : int
+    names    : list[str]
+    ops      : memoryview
+    kinds    : memoryview
+    args     : memoryview
+    strings  : list[str]
+    routines : dict[str, int]
+    labels   : dict[tuple[str, str], int]
+
+    def __len__(self):
+        return len(self.ops)
+
+    def operand(self, pc):
+        if self.kinds[pc] == kind_int: return self.args[pc]
+        if self.kinds[pc] == kind_none: return None
+        return self.strings[self.args[pc]]
+
+    #(inst, arg) tuples, as produced by lex()
+    def prog(self):
+        return [
+            (self.names[self.ops[pc]], self.operand(pc))
+            for pc in range(len(self))
+        ]
+
+    #same as decode(self.prog()), but straight from the columns
+    def code(self):
+        remap = [opcode.get(name, opcode['nop']) for name in self.names]
+        registered = [name in register_ops for name in self.names]
+        return [
+            (remap[op],
+                register_operands(self.strings[arg]) if registered[op] else
+                arg if kind == kind_int else None)
+            for op, kind, arg in zip(self.ops, self.kinds, self.args)
+        ]
+
+    #text form of the build, with symbols as annotations
+    def render(self):
+        marks = {}
+        for name, addr in self.routines.items():
+            marks.setdefault(addr, []).append(f'"rout {name}')
+        for (name, routine), addr in self.labels.items():
+            marks.setdefault(addr, []).append(f'"lab {name}')
+
+        lines = []
+        for pc, (inst, arg) in enumerate(self.prog()):
+            lines += marks.get(pc, [])
+            lines.append(f"{inst} {arg if arg is not None else ''}".strip())
+        return "\n".join(lines)
+
+
+def load_image(path):
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, _, entry, count, *offsets = image_header.unpack_from(mm)
+    if magic != image_magic or version != image_version:
+        raise ValueError(f"{path}: unsupported build image version {version}")
+
+    names_at, ops_at, kinds_at, args_at, strings_at, symbols_at = offsets
+    view = memoryview(mm)
+
+    def column(at, fmt):
+        size = struct.calcsize(fmt)
+        col = view[at : at + size * count].cast(fmt)
+        if sys.byteorder == 'little':
+            return col
+        col = array(fmt, col)
+        col.byteswap()
+        return col
+
+    def text(at, fmt):
+        (size,) = struct.unpack_from(fmt, mm, at)
+        at += struct.calcsize(fmt)
+        return bytes(mm[at : at + size]).decode(), at + size
+
+    names = []
+    at = names_at
+    while at < ops_at and mm[at]:
+        name, at = text(at, '<B')
+        names.append(name)
+
+    strings = []
+    at = strings_at
+    while at < symbols_at:
+        string, at = text(at, '<I')
+        strings.append(string)
+
+    routines = {}
+    labels = {}
+    at = symbols_at
+    while at < len(mm):
+        kind, addr = struct.unpack_from('<BI', mm, at)
+        name,  at = text(at + 5, '<H')
+        scope, at = text(at, '<H')
+        if kind == 0: routines[name] = addr
+        else:         labels[(name, scope)] = addr
+
+    return image(
+        entry    = entry,
+        names    = names,
+        ops      = column(ops_at,   'H'),
+        kinds    = column(kinds_at, 'B'),
+        args     = column(args_at,  'q'),
+        strings  = strings,
+        routines = routines,
+        labels   = labels,
+    )
+
+
+#routine table of a text build, from the '"rout name' annotations
+def annotations(raw):
+    routines = {}
+    addr = 0
+    for line_raw in raw.split('\n'):
+        line = line_raw.strip()
+        if not line: continue
+        if line.startswith('"rout '):
+            routines[line.split(' ', 1)[1]] = addr
+        if line.startswith('"'): continue
+        addr += 1
+
+    return routines
+
+#routine table of a loaded build
+def routine_table(prog, path):
+    if type(prog) is image:
+        return prog.routines
+    with open(path, 'r') as f:
+        return annotations(f.read())
+
+
+#binary images are memory mapped, anything else is treated as text
+def load(path):
+    with open(path, 'rb') as f:
+        head = f.read(len(image_magic))
+
+    if head == image_magic:
+        return load_image(path)
+
+    with open(path, 'r') as f:
+        return lex(f.read())
+
+
+
+def run(prog, mem_size=65536):
 
     pc = 0
     acc = 0
@@ -39,6 +210,7 @@ def run(prog):
     base  = stack       #base  pointer
 
     running = True
+    steps = 0
 
 
     def push(x):
@@ -64,6 +236,7 @@ def run(prog):
     while pc < len(prog) and running:
         inst, arg = prog[pc]
         pc += 1
+        steps += 1
 
 
         #virtual arg, relative to stack frame
@@ -99,7 +272,7 @@ def run(prog):
                 if acc != 0: pc = arg
 
             #routines
-            case 'call':
+            case 'call' | 'ncall':
                 #flow control
                 sys_push(pc)
                 pc = arg
@@ -108,6 +281,10 @@ def run(prog):
                 sys_push(base) #save base pointer
                 base = stack #construct new frame
 
+            case 'tail':
+                stack = base  #reuse the current frame and its return
+                pc = arg
+
             case 'return':
                 stack = base  #collaps current frame (if it even exists)
                 base = sys_pull() #reconstruct old frame
@@ -141,13 +318,1860 @@ def run(prog):
 
             case 'halt':  running = False
 
+    return steps
+
+
+
+#instruction set of the decoded engine, index is the opcode.
+#instructions unknown to the isa decode to nop, just like run() ignores them
+isa = (
+    'nop',
+    'const',
+    'add', 'sub', 'greater', 'lesser', 'equal', 'mul', 'inc', 'dec', 'or', 'and',
+    'push', 'pull', 'dup',
+    'load', 'store',
+    'jump', 'branch',
+    'call', 'return', 'tail',
+    'alloc', 'free', 'trans',
+    'deref', 'ref',
+    'debug', 'halt', 'snapshot',
+    'write', 'read', 'send', 'recv', 'flush',
+    'ncall', 'native',
+    'spawn', 'join',
+
+    #register isa, see register_ops
+    'rmov', 'radd', 'rsub', 'rmul', 'rand', 'ror',
+    'rgreater', 'rlesser', 'requal', 'rge', 'rle', 'randb', 'rorb', 'rfield',
+
+    #superinstructions, only produced by fuse()
+    'push_const', 'push_load', 'and_const', 'field_const', 'field_load',
+)
+
+opcode = {name: op for op, name in enumerate(isa)}
+
+
+#three address instructions of the register isa (compiler --isa reg).
+#the operand is 'dst,src,src': dst is a register rN, every source is a
+#register rN, a frame slot sN or an immediate. r0 is the acc, r1 and up
+#only hold values while an expression is evaluated, so they are never
+#live across statements (calls, snapshots).
+#the register file is made of the same words as memory: with the array
+#backend values written to r1 and up wrap like a push would.
+#each entry is the operation on the sources and its python form for the jit
+registers = 8
+
+register_ops = {
+    'rmov':     (None,                         '{}'),
+    'radd':     (operator.add,                 '{} + {}'),
+    'rsub':     (operator.sub,                 '{} - {}'),
+    'rmul':     (operator.mul,                 '{} * {}'),
+    'rand':     (operator.and_,                '{} & {}'),
+    'ror':      (operator.or_,                 '{} | {}'),
+    'rgreater': (operator.gt,                  '{} > {}'),
+    'rlesser':  (operator.lt,                  '{} < {}'),
+    'requal':   (operator.eq,                  '{} == {}'),
+    'rge':      (lambda a, b: a + 1 > b,       '{} + 1 > {}'),   #inc; greater
+    'rle':      (lambda a, b: a - 1 < b,       '{} - 1 < {}'),   #dec; lesser
+    'randb':    (lambda a, b: 1 & (a & b),     '1 & ({} & {})'), #and + bool_normalize
+    'rorb':     (lambda a, b: 1 & (a | b),     '1 & ({} | {})'), #or + bool_normalize
+    'rfield':   (None,                         'mem[{} + {}]'),  #add; deref
+}
+
+
+#'r1,s2,-5' -> (1, ('s', 2), ('i', -5)): the destination register,
+#then the sources as (mode, value) with mode 'r', 's' or 'i'
+def register_operands(text):
+    dst, *srcs = text.split(',')
+    if dst[0] != 'r':
+        raise ValueError(f"register operand '{text}' does not start with a register")
+
+    def source(x):
+        if x[0] in 'rs': return (x[0], int(x[1:]))
+        return ('i', int(x))
+
+    operands = (int(dst[1:]), *map(source, srcs))
+    for x in (operands[0], *(v for mode, v in operands[1:] if mode == 'r')):
+        if not 0 <= x < registers:
+            raise ValueError(f"register operand '{text}' is outside r0..r{registers - 1}")
+    return operands
+
+
+#turn (inst, arg) tuples into (opcode, operand) pairs.
+#operands are resolved once here instead of on every step
+def decode(prog):
+    if type(prog) is image:
+        return prog.code()
+
+    code = []
+    for inst, arg in prog:
+        op = opcode.get(inst, opcode['nop'])
+
+        match inst:
+            case 'const': arg = int(arg)
+            case _ if inst in register_ops: arg = register_operands(arg)
+            case _ if type(arg) is not int: arg = None
+
+        code.append((op, arg))
+
+    return code
+
+
+
+#superinstructions for the sequences the compiler emits most:
+#   const N; push                   pushing a literal
+#   load x; push                    pushing a variable
+#   push; const 1; and              bool_normalize in expr.node.generate
+#   const k; push; load x; add; deref    x.k with k constant
+#   load y; push; load x; add; deref     x.y
+#tried in order, so longer patterns go first
+fusions = (
+    ('field_const', ('const', 'push', 'load', 'add', 'deref')),
+    ('field_load',  ('load',  'push', 'load', 'add', 'deref')),
+    ('and_const',   ('push', 'const', 'and')),
+    ('push_const',  ('const', 'push')),
+    ('push_load',   ('load',  'push')),
+)
+
+branching = (
+    opcode['jump'], opcode['branch'], opcode['call'], opcode['ncall'],
+    opcode['tail'], opcode['spawn'],
+)
+
+
+#replace fusable sequences in decoded code by superinstructions.
+#a sequence is only fused if nothing jumps into its middle, branch
+#targets are remapped afterwards. returns the new code and the hits
+#per superinstruction
+def fuse(code):
+    patterns = [
+        (opcode[name], tuple(opcode[inst] for inst in pattern))
+        for name, pattern in fusions
+    ]
+
+    #everything control can land on: branch targets and return addresses
+    targets = set()
+    for pc, (op, arg) in enumerate(code):
+        if op in branching:
+            targets.add(arg)
+        if op == opcode['call']:
+            targets.add(pc + 1)
+
+    fused = []
+    remap = {}
+    hits = {name: 0 for name, _ in fusions}
+
+    pc = 0
+    while pc < len(code):
+        remap[pc] = len(fused)
+
+        for (fused_op, pattern), (name, _) in zip(patterns, fusions):
+            size = len(pattern)
+            window = code[pc : pc + size]
+
+            if tuple(op for op, _ in window) != pattern: continue
+            if any(pc + i in targets for i in range(1, size)): continue
+
+            args = tuple(arg for _, arg in window if arg is not None)
+            fused.append((fused_op, args if len(args) > 1 else args[0]))
+            hits[name] += 1
+            pc += size
+            break
+
+        else:
+            fused.append(code[pc])
+            pc += 1
+
+    remap[len(code)] = len(fused)
+
+    fused = [
+        (op, remap[arg]) if op in branching else (op, arg)
+        for op, arg in fused
+    ]
+
+    return fused, hits
+
+
+#instructions each superinstruction replaces
+fusion_width = {opcode[name]: len(pattern) for name, pattern in fusions}
+
+
+
+#vm memory backends.
+#'array' stores fixed width 64 bit words: values written from acc that do
+#not fit wrap around (two's complement) and comparison results are stored
+#as 0/1. the acc itself stays unbounded, so only stores are affected.
+#'list' keeps the unbounded python ints of run().
+word_bits = 64
+memories = ('array', 'list')
+
+def memory(size=65536, kind='array'):
+    match kind:
+        case 'array': return array('q', bytes(size * (word_bits // 8)))
+        case 'list':  return [0] * size
+
+def wrap(x):
+    x = int(x) & ((1 << word_bits) - 1)
+    return x - (1 << word_bits) if x >> (word_bits - 1) else x
+
+
+def digest(mem):
+    if type(mem) is list:
+        mem = repr(mem).encode()
+    return hashlib.sha256(mem).hexdigest()
+
+
+#zero copy host access to an array memory
+def region(mem, addr, size):
+    return memoryview(mem)[addr : addr + size]
+
+#heap buffer of a Heap (lib/heap.snug): [size, buffer]
+def heap_view(mem, heap):
+    return region(mem, mem[heap + 1], mem[heap])
+
+#payload of a chunk returned by Heap::New, the header before it holds len + 1
+def chunk_view(mem, ptr):
+    return region(mem, ptr, mem[ptr - 1] - 1)
+
+
+#host i/o channels.
+#values are buffered on the host side and written in bulk once the buffer
+#holds capacity values (capacity 1 writes every value right away), on a
+#flush instruction and when the run ends. text channels hold one decimal
+#value per line on output and whitespace separated values on input,
+#binary channels hold raw i64 words.
+#by default 0 is stdin, 1 is stdout and 2 is stderr; debug writes to 1
+@dataclass
+class channel:
+    file     : typing.IO
+    binary   : bool = False
+    capacity : int = 4096
+
+    buffer  : list = field(default_factory=lambda: [])
+
+    #input side
+    pending : collections.deque = field(default_factory=lambda: collections.deque())
+    tail    : bytes | str = ''
+    eof     : bool = False
+
+    chunk = 1 << 16 #bytes per read from the file
+
+    def __post_init__(self):
+        if self.binary: self.tail = b''
+
+    def write(self, x):
+        self.buffer.append(x)
+        if len(self.buffer) >= self.capacity:
+            self.flush()
+
+    def write_many(self, values):
+        self.buffer += values
+        if len(self.buffer) >= self.capacity:
+            self.flush()
+
+    def flush(self):
+        if not self.buffer:
+            return
+
+        if self.binary:
+            words = array('q', map(wrap, self.buffer))
+            if sys.byteorder != 'little':
+                words.byteswap()
+            self.file.write(words.tobytes())
+        else:
+            self.file.write("".join(f"{x}\n" for x in self.buffer))
+
+        self.buffer.clear()
+        self.file.flush()
+
+    #pull the next chunk of the file into pending
+    def fill(self):
+        raw = self.file.read(self.chunk)
+        if not raw:
+            self.eof = True
+            raw = b'' if self.binary else ''
+
+        if self.binary:
+            raw = self.tail + raw
+            cut = len(raw) - len(raw) % 8
+            words = array('q', raw[:cut])
+            if sys.byteorder != 'little':
+                words.byteswap()
+            self.pending.extend(words)
+            self.tail = raw[cut:]
+            return
+
+        tokens = (self.tail + raw).split()
+        self.tail = ''
+        if tokens and not self.eof and not raw[-1].isspace():
+            self.tail = tokens.pop()
+        self.pending.extend(int(x) for x in tokens)
+
+    #next value, -1 once the input is exhausted
+    def read(self):
+        while not self.pending and not self.eof:
+            self.fill()
+        return self.pending.popleft() if self.pending else -1
+
+    def read_many(self, count):
+        while len(self.pending) < count and not self.eof:
+            self.fill()
+
+        count = min(count, len(self.pending))
+        return [self.pending.popleft() for _ in range(count)]
+
+
+def channels(capacity=4096):
+    return {
+        0: channel(sys.stdin),
+        1: channel(sys.stdout, capacity=capacity),
+        2: channel(sys.stderr, capacity=capacity),
+    }
+
+
+#channel spec from the command line: N=PATH or N=PATH:bin
+def open_channel(spec, mode, capacity):
+    num, path = spec.split('=', 1)
+    binary = path.endswith(':bin')
+    if binary:
+        path = path[:-len(':bin')]
+
+    f = open(path, mode + ('b' if binary else ''))
+    return int(num), channel(f, binary, capacity)
+
+
+#write count words of memory starting at addr
+def send(ch, mem, addr, count):
+    ch.write_many(mem[addr : addr + count].tolist() if type(mem) is array else mem[addr : addr + count])
+
+#read up to count words into memory at addr, returns how many were read
+def recv(ch, mem, addr, count):
+    values = ch.read_many(count)
+    if type(mem) is array:
+        try:
+            values = array('q', values)
+        except OverflowError:
+            values = array('q', map(wrap, values))
+    mem[addr : addr + len(values)] = values
+    return len(values)
+
+
+#native intrinsics.
+#routines declared with 'intrinsic Name;' are called through ncall. ncall
+#behaves exactly like call, unless a python implementation is registered
+#for the routine: bind() then turns it into a native instruction running
+#that implementation instead. implementations follow the calling convention
+#of the snug routine: they take mem and the data stack pointer, pull their
+#arguments, push their results and return the new data stack pointer
+intrinsics = {}
+
+def zero(mem, addr, count):
+    count = max(count, 0)
+    mem[addr : addr + count] = \
+        array('q', bytes(8 * count)) if type(mem) is array else [0] * count
+
+def intrinsic(name):
+    def register(f):
+        intrinsics[name] = f
+        return f
+    return register
+
+
+@intrinsic('Stack::Swap')
+def _(mem, data):
+    mem[data + 1], mem[data + 2] = mem[data + 2], mem[data + 1]
+    return data
+
+@intrinsic('Stack::Dup')
+def _(mem, data):
+    mem[data] = mem[data + 1]
+    return data - 1
+
+@intrinsic('Stack::Drop')
+def _(mem, data):
+    return data + 1
+
+
+@intrinsic('Heap::New')
+def _(mem, data):
+    request = mem[data + 1]
+    heap    = mem[data + 2]
+
+    needed = request + 1
+    walker = mem[heap + 1] #Heap::buffer
+
+    trail = needed
+    while trail > 0:
+        skip = mem[walker]
+        if skip:
+            walker += skip
+            trail = needed
+        else:
+            walker += 1
+            trail -= 1
+
+    ptr = walker - needed
+    mem[ptr] = needed
+    mem[data + 2] = ptr + 1
+    return data + 1
+
+@intrinsic('Heap::Void')
+def _(mem, data):
+    start = mem[data + 1] - 1
+    zero(mem, start, mem[start]) #header and payload
+    return data + 1
+
+
+@intrinsic('Chunk::Len')
+def _(mem, data):
+    ptr = mem[data + 1]
+    mem[data + 1] = mem[ptr - 1] - 1
+    return data
+
+@intrinsic('Chunk::Sum')
+def _(mem, data):
+    ptr = mem[data + 1]
+    size = mem[ptr - 1] - 1
+
+    #the snug loop runs at least once, reading ptr.(-1) for empty chunks
+    total = mem[ptr + size - 1] if size <= 0 else sum(mem[ptr : ptr + size])
+    try:
+        mem[data + 1] = total
+    except OverflowError:
+        mem[data + 1] = wrap(total)
+    return data
+
+@intrinsic('Chunk::Zero')
+def _(mem, data):
+    ptr = mem[data + 1]
+    zero(mem, ptr, max(mem[ptr - 1] - 1, 1)) #at least one word, like the snug loop
+    return data + 1
+
+
+#replace ncall of routines with a registered implementation by native
+def bind(code, routines, registry=intrinsics):
+    natives = {
+        addr: registry[name]
+        for name, addr in routines.items() if name in registry
+    }
+    return [
+        (opcode['native'], natives[arg])
+        if op == opcode['ncall'] and arg in natives else (op, arg)
+        for op, arg in code
+    ]
+
+
+#run routine addr on mem through the snug code, from the given data and
+#stack pointers. returns the data and stack pointers after the return
+def invoke(code, mem, addr, data, stack):
+    harness = code + [
+        (opcode['call'], addr),
+        (opcode['snapshot'], None),
+        (opcode['halt'], None),
+    ]
+
+    after = []
+    engine(
+        harness, mem,
+        resume = (len(code), 0, data, stack, stack),
+        on_snapshot = lambda pc, acc, data, stack, base, mem: after.append((data, stack)),
+    )()
+    return after[0]
+
+
+#differential check of every bound intrinsic against its snug routine,
+#on random heap states. only memory that outlives the call is compared:
+#everything below the system stack and the data stack.
+#returns {name: (cases, failures)}
+def conformance(code, routines, trials=200, seed=0, registry=intrinsics):
+    rng = random.Random(seed)
+    mem_size = 1 << 14
+    present = sorted(name for name in registry if name in routines)
+    results = {name: [0, []] for name in present}
+
+    #a heap in a buffer at the bottom, system stack above it, laid out
+    #like Heap::Create does, which may be inlined and not in the build.
+    #Heap::New has no bounds check, so it is kept at most a quarter full
+    mem = memory(mem_size)
+    buffer, size = 0, 8192
+    stack = buffer + size
+    data = mem_size - 1
+
+    heap = buffer
+    mem[heap + 0] = size - 2   #Heap::size, less the header
+    mem[heap + 1] = buffer + 2 #Heap::buffer
+
+    live = []
+
+    def arguments(name):
+        match name:
+            case 'Heap::New':
+                used = sum(mem[ptr - 1] for ptr in live)
+                return [heap, rng.randrange(1, 64)] if used < size // 4 else None
+            case 'Heap::Void' | 'Chunk::Len' | 'Chunk::Sum' | 'Chunk::Zero':
+                return [rng.choice(live)] if live else None
+            case _:
+                return [rng.randrange(-1000, 1000) for _ in range(3)]
+
+    for _ in range(trials):
+        name = rng.choice(present)
+        args = arguments(name)
+        if args is None:
+            continue
+
+        #random contents for the chunk routines to look at
+        for ptr in live:
+            for i in range(mem[ptr - 1] - 1):
+                if rng.random() < 0.3:
+                    mem[ptr + i] = rng.randrange(0, 100)
+
+        snug = array('q', mem)
+        native = array('q', mem)
+
+        top = data
+        for x in args:
+            snug[top] = native[top] = x
+            top -= 1
+
+        data_snug, _ = invoke(code, snug, routines[name], top, stack)
+        data_native = registry[name](native, top)
+
+        results[name][0] += 1
+        if data_snug != data_native or \
+                snug[:stack] != native[:stack] or \
+                snug[data_snug + 1:] != native[data_native + 1:]:
+            results[name][1].append(args)
+
+        #carry on from the snug state, dropping results off the data stack
+        mem = snug
+        if name == 'Heap::New':
+            live.append(mem[data_snug + 1])
+        if name == 'Heap::Void':
+            live.remove(args[0])
+
+    return {name: (cases, failures) for name, (cases, failures) in results.items()}
+
+
+#jit tier of the decoded engine.
+#the engine counts executions of every jump/branch target; once a target
+#gets hot, the straight line code from there up to the next unconditional
+#transfer is translated to python and compiled. jumps inside that region
+#stay inside the compiled function, everything else exits back to the
+#engine with the pc to continue at. a block also exits at a jump inside
+#it once it ran fuel instructions, so a compiled loop cannot outlast a
+#time slice. between those checks it runs at most size instructions.
+@dataclass
+class jit:
+    threshold : int = 16
+    limit     : int = 256 #max instructions per block
+
+    #compiled blocks by start pc, plus their source for inspection
+    cache  : dict[int, typing.Callable] = field(default_factory=lambda: {})
+    source : dict[int, str]             = field(default_factory=lambda: {})
+    counts : dict[int, int]             = field(default_factory=lambda: {})
+    failed : set[int]                   = field(default_factory=lambda: set())
+
+    def invalidate(self, pc=None):
+        if pc is None:
+            self.cache.clear()
+            self.source.clear()
+            self.counts.clear()
+            self.failed.clear()
+            return
+
+        self.cache.pop(pc, None)
+        self.source.pop(pc, None)
+        self.counts.pop(pc, None)
+        self.failed.discard(pc)
+
+    #count an execution of pc, returns the block once it is compiled
+    def heat(self, code, pc):
+        count = self.counts.get(pc, 0) + 1
+        self.counts[pc] = count
+
+        if count < self.threshold or pc in self.failed:
+            return None
+
+        block = self.translate(code, pc)
+        if block is None:
+            self.failed.add(pc)
+        return block
+
+    def translate(self, code, start):
+        #region, ends before anything that touches the frames or halts
+        stop = start
+        while stop < len(code) and stop - start < self.limit:
+            name = isa[code[stop][0]]
+            if name in ('call', 'ncall', 'tail', 'return', 'halt', 'snapshot', 'spawn', 'join'): break
+            stop += 1
+            if name == 'jump': break
+
+        if stop == start:
+            return None
+
+        #sub blocks begin at every target inside the region
+        heads = {start} | {
+            arg for op, arg in code[start:stop]
+            if isa[op] in ('jump', 'branch') and start <= arg < stop
+        }
+        label = {pc: i for i, pc in enumerate(sorted(heads))}
+
+        def transfer(target, n):
+            if target in label:
+                return [
+                    f"n += {n}",
+                    f"if n >= fuel: return {target}, acc, data, stack, base, n",
+                    f"L = {label[target]}",
+                    "continue",
+                ]
+            return [f"n += {n}", f"return {target}, acc, data, stack, base, n"]
+
+        def store(target, value='acc'):
+            return [
+                "try:",
+                f"    mem[{target}] = {value}",
+                "except OverflowError:",
+                f"    mem[{target}] = wrap({value})",
+            ]
+
+        def operand(mode, x):
+            match mode:
+                case 'r' if x == 0: return "acc"
+                case 'r': return f"regs[{x}]"
+                case 's': return f"mem[base + {x}]"
+                case _:   return f"({x})"
+
+        def register(arg, template):
+            dst, *srcs = arg
+            value = template.format(*(operand(*x) for x in srcs))
+            if dst == 0:
+                return [f"acc = {value}"]
+            return [
+                "try:",
+                f"    regs[{dst}] = {value}",
+                "except OverflowError:",
+                f"    regs[{dst}] = wrap({value})",
+            ]
+
+        natives = {}
+        blocks = []
+        n = 0
+        for pc in range(start, stop):
+            if pc in label:
+                if blocks:
+                    blocks[-1] += [f"n += {n}", f"L = {label[pc]}"]
+                blocks.append([])
+                n = 0
+
+            op, arg = code[pc]
+            n += 1
+            lines = blocks[-1]
+
+            match isa[op]:
+                case 'nop':     pass
+                case 'const':   lines += [f"acc = {arg}"]
+                case 'add':     lines += ["data += 1", "acc += mem[data]"]
+                case 'sub':     lines += ["data += 1", "acc -= mem[data]"]
+                case 'greater': lines += ["data += 1", "acc = (acc > mem[data])"]
+                case 'lesser':  lines += ["data += 1", "acc = (acc < mem[data])"]
+                case 'equal':   lines += ["data += 1", "acc = (acc == mem[data])"]
+                case 'mul':     lines += ["data += 1", "acc = acc * mem[data]"]
+                case 'inc':     lines += ["acc += 1"]
+                case 'dec':     lines += ["acc -= 1"]
+                case 'or':      lines += ["data += 1", "acc |= mem[data]"]
+                case 'and':     lines += ["data += 1", "acc &= mem[data]"]
+
+                case 'push':    lines += store("data") + ["data -= 1"]
+                case 'pull':    lines += ["data += 1", "acc = mem[data]"]
+                case 'dup':     lines += ["mem[data] = mem[stack-1]", "data -= 1"]
+
+                case 'load':    lines += [f"acc = mem[base + {arg}]"]
+                case 'store':   lines += store(f"base + {arg}")
+
+                case 'jump':    lines += transfer(arg, n)
+                case 'branch':  lines += ["if acc != 0:"] + [
+                                    "    " + x for x in transfer(arg, n)]
+
+                case 'alloc':   lines += [f"stack += {arg}"]
+                case 'free':    lines += [f"stack -= {arg}"]
+                case 'trans':   lines += ["acc, stack = stack, stack + acc"]
+
+                case 'deref':   lines += ["acc = mem[acc]"]
+                case 'ref':     lines += ["data += 1", "mem[acc] = mem[data]"]
+
+                case 'debug':   lines += ["emit(acc)"]
+
+                case 'write':   lines += [f"io[{arg}].write(acc)"]
+                case 'read':    lines += [f"acc = io[{arg}].read()"]
+                case 'send':    lines += ["data += 1", f"send(io[{arg}], mem, acc, mem[data])"]
+                case 'recv':    lines += ["data += 1", f"acc = recv(io[{arg}], mem, acc, mem[data])"]
+                case 'flush':   lines += [f"io[{arg}].flush()"]
+
+                case 'native':
+                    natives[f"native_{pc}"] = arg
+                    lines += [f"data = native_{pc}(mem, data)"]
+
+                case 'push_const':
+                    lines += [f"acc = {arg}"] + store("data") + ["data -= 1"]
+                case 'push_load':
+                    lines += [f"acc = mem[base + {arg}]", "mem[data] = acc", "data -= 1"]
+                case 'and_const':
+                    lines += store("data") + [f"acc = {arg} & mem[data]"]
+                case 'field_const':
+                    lines += store("data", arg[0]) + [f"acc = mem[mem[base + {arg[1]}] + mem[data]]"]
+                case 'field_load':
+                    lines += [f"mem[data] = mem[base + {arg[0]}]", f"acc = mem[mem[base + {arg[1]}] + mem[data]]"]
+
+                case x if x in register_ops:
+                    lines += register(arg, register_ops[x][1])
+
+                case _:
+                    return None
+
+        if isa[code[stop - 1][0]] != 'jump':
+            blocks[-1] += transfer(stop, n)
+
+        src = [
+            "def block(acc, data, stack, base, mem, emit, io, regs, fuel):",
+            "    n = 0",
+            "    L = 0",
+            "    while True:",
+        ]
+        for i, lines in enumerate(blocks):
+            src.append(f"        if L == {i}:")
+            src += ["            " + x for x in lines]
+        src = "\n".join(src)
+
+        namespace = {'wrap': wrap, 'send': send, 'recv': recv, **natives}
+        exec(compile(src, f"<jit {start}>", 'exec'), namespace)
+
+        block = namespace['block']
+        block.size = stop - start
+
+        self.source[start] = src
+        self.cache[start] = block
+        return block
+
+
+
+#profiling run of the decoded engine.
+#runs unfused, without jit and natives so every pc matches the build
+#(and --disasm).
+#steps are attributed to the routine call stack, which is tracked across
+#call/return using the routine table of the build
+@dataclass
+class profiler:
+    routines : dict[str, int]
+    labels   : dict[tuple[str, str], int] = field(default_factory=lambda: {})
+
+    counts : list[int]                 = field(default_factory=lambda: [])
+    stacks : dict[tuple[str, ...], int] = field(default_factory=lambda: {})
+    edges  : dict[tuple[int, int], int] = field(default_factory=lambda: {})
+    code   : list                      = field(default_factory=lambda: [])
+
+    root = '(link)'
+
+    def run(self, handlers, code, end):
+        self.code = code
+        self.counts = counts = [0] * end
+        stacks = self.stacks
+        edges = self.edges
+
+        names = {addr: name for name, addr in self.routines.items()}
+        ops = [op for op, _ in code]
+        call, ncall, tail, ret = opcode['call'], opcode['ncall'], opcode['tail'], opcode['return']
+        backward = [
+            op in (opcode['jump'], opcode['branch']) and arg <= pc
+            for pc, (op, arg) in enumerate(code)
+        ]
+
+        stack = [self.root]
+        key = tuple(stack)
+        since = 0
+
+        pc = 0
+        while pc < end:
+            counts[pc] += 1
+            nxt = handlers[pc]()
+            op = ops[pc]
+
+            if op == call or op == ncall or op == tail or op == ret:
+                stacks[key] = stacks.get(key, 0) + since + 1
+                since = 0
+
+                if op == tail and len(stack) > 1: #the callee takes the frame over
+                    stack.pop()
+                if op != ret:
+                    stack.append(names.get(nxt, f"@{nxt}"))
+                elif len(stack) > 1:
+                    stack.pop()
+                key = tuple(stack)
+            else:
+                since += 1
+
+            if backward[pc] and nxt <= pc:
+                edges[(nxt, pc)] = edges.get((nxt, pc), 0) + 1
+
+            pc = nxt
+
+        stacks[key] = stacks.get(key, 0) + since
+        return sum(counts)
+
+    def routine_at(self, pc):
+        owner = self.root
+        for name, addr in sorted(self.routines.items(), key=lambda x: x[1]):
+            if addr <= pc: owner = name
+        return owner
+
+    #flamegraph input: one "a;b;c count" line per call stack
+    def collapsed(self):
+        lines = []
+        for stack, count in sorted(self.stacks.items()):
+            if not count: continue
+            if len(stack) > 1: stack = stack[1:]
+            lines.append(f"{';'.join(stack)} {count}")
+        return "\n".join(lines) + "\n"
+
+    def summary(self, top=10):
+        steps = sum(self.counts)
+        lines = [f"steps: {steps}", ""]
+
+        ops = {}
+        for pc, count in enumerate(self.counts):
+            name = isa[self.code[pc][0]]
+            ops[name] = ops.get(name, 0) + count
+
+        lines.append("opcode        steps      %")
+        for name, count in sorted(ops.items(), key=lambda x: -x[1]):
+            if not count: continue
+            lines.append(f"{name:10} {count:8} {100 * count / steps:6.2f}")
+
+        inclusive = {}
+        exclusive = {}
+        for stack, count in self.stacks.items():
+            exclusive[stack[-1]] = exclusive.get(stack[-1], 0) + count
+            for name in set(stack):
+                inclusive[name] = inclusive.get(name, 0) + count
+
+        lines += ["", "routine                   inclusive  exclusive"]
+        for name, count in sorted(inclusive.items(), key=lambda x: -x[1]):
+            lines.append(f"{name:24} {count:10} {exclusive.get(name, 0):10}")
+
+        label_at = {addr: name for (name, _), addr in self.labels.items()}
+
+        lines += ["", "loop                      pcs          back-edges      steps"]
+        hot = sorted(self.edges.items(), key=lambda x: -x[1])[:top]
+        for (target, pc), count in hot:
+            name = f"{self.routine_at(target)}:{label_at.get(target, target)}"
+            inside = sum(self.counts[target : pc + 1])
+            lines.append(f"{name:24} {target:5}..{pc:<5} {count:11} {inside:10}")
+
+        lines += ["", "pc     inst          steps"]
+        hot = sorted(range(len(self.counts)), key=lambda pc: -self.counts[pc])[:top]
+        for pc in hot:
+            op, arg = self.code[pc]
+            inst = f"{isa[op]} {arg if arg is not None else ''}".strip()
+            lines.append(f"{pc:<6} {inst:12} {self.counts[pc]:8}")
+
+        return "\n".join(lines)
+
+
+
+#vm snapshots: registers and the whole memory, for warm starts.
+#   header   magic, version, acc length, build fingerprint,
+#            pc, data, stack, base, memory size
+#   acc      repr of acc (it is unbounded, and may be a bool)
+#   memory   i64 words, aligned to 8 bytes
+#return addresses live in memory, so a snapshot only fits the exact code
+#it was taken from: same build, same fusion setting
+snapshot_magic   = b'SNAP'
+snapshot_version = 1
+snapshot_header  = struct.Struct('<4sHH32s4qQ')
+
+#identifies the code a snapshot belongs to. natives go by the name of
+#their intrinsic, the repr of a function holds an address of this process
+def fingerprint(code):
+    names = {f: name for name, f in intrinsics.items()}
+    def stable(arg):
+        if type(arg) is tuple:
+            return tuple(map(stable, arg))
+        return names.get(arg, arg) if callable(arg) else arg
+
+    return hashlib.sha256(repr([(op, stable(arg)) for op, arg in code]).encode()).digest()
+
+def save_snapshot(path, build, pc, acc, data, stack, base, mem):
+    if type(mem) is list:
+        mem = array('q', map(wrap, mem))
+
+    acc_raw = repr(acc).encode()
+    head = snapshot_header.pack(
+        snapshot_magic, snapshot_version, len(acc_raw), build,
+        pc, data, stack, base, len(mem)
+    ) + acc_raw
+    head += bytes(-len(head) % 8)
+
+    if sys.byteorder != 'little':
+        mem = array('q', mem)
+        mem.byteswap()
+
+    with open(path, 'wb') as f:
+        f.write(head)
+        f.write(mem)
+
+#returns build fingerprint, (pc, acc, data, stack, base) and memory
+def load_snapshot(path, kind='array'):
+    with open(path, 'rb') as f:
+        mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    magic, version, acc_len, build, pc, data, stack, base, size = \
+        snapshot_header.unpack_from(mm)
+    if magic != snapshot_magic or version != snapshot_version:
+        raise ValueError(f"{path}: unsupported snapshot version {version}")
+
+    at = snapshot_header.size
+    acc_raw = bytes(mm[at : at + acc_len]).decode()
+    at += acc_len
+    at += -at % 8
+
+    match acc_raw:
+        case 'True':  acc = True
+        case 'False': acc = False
+        case _:       acc = int(acc_raw)
+
+    mem = array('q')
+    mem.frombytes(memoryview(mm)[at : at + size * 8])
+    if sys.byteorder != 'little':
+        mem.byteswap()
+    if kind == 'list':
+        mem = mem.tolist()
+
+    return build, (pc, acc, data, stack, base), mem
+
+
+#build one closure per instruction; each closure performs its
+#instruction on the shared machine state and returns the next pc
+#inputs are pushed onto the data stack before the run,
+#emit receives the value of every debug instruction,
+#io maps channel numbers to channels (default: channels()).
+#resume is a (pc, acc, data, stack, base) state to continue from, and
+#on_snapshot(pc, acc, data, stack, base, mem) is called at checkpoints.
+#workers runs spawned routines (see workers), mem has to be its memory.
+#returns run (see execute), run.state() is the machine state in between
+def engine(code, mem=None, jit=None, inputs=(), emit=print, io=None,
+        resume=None, on_snapshot=None, workers=None):
+
+    acc = 0
+    mem = memory() if mem is None else mem
+    mem_size = len(mem)
+
+    data = mem_size - 1 #user pointer
+    stack = 0           #stack pointer
+    base  = stack       #base  pointer
+
+    for x in inputs:
+        mem[data] = x
+        data -= 1
+
+    entry = 0
+    if resume is not None:
+        entry, acc, data, stack, base = resume
+
+    end = len(code)
+
+    #steps run inside jit blocks, beyond the one dispatch entering them,
+    #and how many steps are left to run
+    jitted = 0
+    unlimited = sys.maxsize
+    fuel = unlimited
+
+
+    def _nop(arg, nxt):
+        def f(): return nxt
+        return f
+
+    def _const(arg, nxt):
+        def f():
+            nonlocal acc
+            acc = arg
+            return nxt
+        return f
+
+
+    #arithmatic
+    def _add(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc += mem[data]
+            return nxt
+        return f
+
+    def _sub(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc -= mem[data]
+            return nxt
+        return f
+
+    def _greater(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = (acc > mem[data])
+            return nxt
+        return f
+
+    def _lesser(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = (acc < mem[data])
+            return nxt
+        return f
+
+    def _equal(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = (acc == mem[data])
+            return nxt
+        return f
+
+    def _mul(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = acc * mem[data]
+            return nxt
+        return f
+
+    def _inc(arg, nxt):
+        def f():
+            nonlocal acc
+            acc += 1
+            return nxt
+        return f
+
+    def _dec(arg, nxt):
+        def f():
+            nonlocal acc
+            acc -= 1
+            return nxt
+        return f
+
+    def _or(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc |= mem[data]
+            return nxt
+        return f
+
+    def _and(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc &= mem[data]
+            return nxt
+        return f
+
+
+    #stack interface
+    def _push(arg, nxt):
+        def f():
+            nonlocal data
+            try:
+                mem[data] = acc
+            except OverflowError:
+                mem[data] = wrap(acc)
+            data -= 1
+            return nxt
+        return f
+
+    def _pull(arg, nxt):
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = mem[data]
+            return nxt
+        return f
+
+    def _dup(arg, nxt):
+        def f():
+            nonlocal data
+            mem[data] = mem[stack-1]
+            data -= 1
+            return nxt
+        return f
+
+
+    #memory interface, arg is relative to stack frame
+    def _load(arg, nxt):
+        def f():
+            nonlocal acc
+            acc = mem[base + arg]
+            return nxt
+        return f
+
+    def _store(arg, nxt):
+        def f():
+            try:
+                mem[base + arg] = acc
+            except OverflowError:
+                mem[base + arg] = wrap(acc)
+            return nxt
+        return f
+
+
+    #branching
+    def _jump(arg, nxt):
+        def f(): return arg
+        return f
+
+    def _branch(arg, nxt):
+        def f(): return arg if acc != 0 else nxt
+        return f
+
+
+    #routines
+    def _call(arg, nxt):
+        def f():
+            nonlocal stack, base
+            mem[stack] = nxt       #save flow
+            mem[stack+1] = base    #save base pointer
+            stack += 2
+            base = stack           #construct new frame
+            return arg
+        return f
+
+    _ncall = _call #unbound intrinsic, see bind()
+
+    #acc is the number of arguments pulled for the routine, acc = handle
+    def _spawn(arg, nxt):
+        def f():
+            nonlocal acc, data
+            args = [mem[data + i] for i in range(acc, 0, -1)]
+            data += acc
+            acc = workers.spawn(arg, args)
+            return nxt
+        return f
+
+    #acc is the handle, pushes the results of the routine
+    def _join(arg, nxt):
+        def f():
+            nonlocal data
+            results, out = workers.join(acc)
+            for x in out:
+                emit(x)
+            for x in results:
+                mem[data] = x
+                data -= 1
+            return nxt
+        return f
+
+    def _native(arg, nxt):
+        def f():
+            nonlocal data
+            data = arg(mem, data)
+            return nxt
+        return f
+
+    def _tail(arg, nxt): #call in place of the current frame
+        def f():
+            nonlocal stack
+            stack = base           #drop locals, keep flow and base pointer
+            return arg
+        return f
+
+    def _return(arg, nxt):
+        def f():
+            nonlocal stack, base
+            stack = base - 2       #collaps current frame
+            base = mem[stack+1]    #reconstruct old frame
+            return mem[stack]      #reconstruct old flow
+        return f
+
+
+    #memory manage
+    def _alloc(arg, nxt):
+        def f():
+            nonlocal stack
+            stack += arg
+            return nxt
+        return f
+
+    def _free(arg, nxt):
+        def f():
+            nonlocal stack
+            stack -= arg
+            return nxt
+        return f
+
+    def _trans(arg, nxt):
+        def f():
+            nonlocal acc, stack
+            size = acc
+            acc = stack
+            stack += size
+            return nxt
+        return f
+
+
+    #for deref/ref: acc is addr
+    def _deref(arg, nxt):
+        def f():
+            nonlocal acc
+            acc = mem[acc]
+            return nxt
+        return f
+
+    def _ref(arg, nxt):
+        def f():
+            nonlocal data
+            data += 1
+            mem[acc] = mem[data]
+            return nxt
+        return f
+
+
+    #superinstructions
+    def _push_const(arg, nxt):
+        def f():
+            nonlocal acc, data
+            acc = arg
+            try:
+                mem[data] = acc
+            except OverflowError:
+                mem[data] = wrap(acc)
+            data -= 1
+            return nxt
+        return f
+
+    def _push_load(arg, nxt):
+        def f():
+            nonlocal acc, data
+            acc = mem[base + arg]
+            mem[data] = acc
+            data -= 1
+            return nxt
+        return f
+
+    def _and_const(arg, nxt):
+        def f():
+            nonlocal acc
+            try:
+                mem[data] = acc
+            except OverflowError:
+                mem[data] = wrap(acc)
+            acc = arg & mem[data]
+            return nxt
+        return f
+
+    def _field_const(arg, nxt):
+        offset, var = arg
+        def f():
+            nonlocal acc
+            try:
+                mem[data] = offset
+            except OverflowError:
+                mem[data] = wrap(offset)
+            acc = mem[mem[base + var] + mem[data]]
+            return nxt
+        return f
+
+    def _field_load(arg, nxt):
+        offset, var = arg
+        def f():
+            nonlocal acc
+            mem[data] = mem[base + offset]
+            acc = mem[mem[base + var] + mem[data]]
+            return nxt
+        return f
+
+
+    #register isa, r0 is the acc
+    regs = [0] * registers if type(mem) is list else array('q', bytes(registers * 8))
+
+    def source(mode, x):
+        match mode:
+            case 'r' if x == 0: return lambda: acc
+            case 'r': return lambda: regs[x]
+            case 's': return lambda: mem[base + x]
+            case _:   return lambda: x
+
+    def _rbinary(fn):
+        def build(arg, nxt):
+            dst, a, b = arg
+            a, b = source(*a), source(*b)
+
+            if dst == 0:
+                def f():
+                    nonlocal acc
+                    acc = fn(a(), b())
+                    return nxt
+                return f
+
+            def f():
+                try:
+                    regs[dst] = fn(a(), b())
+                except OverflowError:
+                    regs[dst] = wrap(fn(a(), b()))
+                return nxt
+            return f
+        return build
+
+    def _rmov(arg, nxt):
+        return _rbinary(lambda a, b: a)((*arg, ('i', 0)), nxt)
+
+    register_builders = {
+        name: _rbinary(fn) for name, (fn, _) in register_ops.items() if fn
+    }
+    register_builders['rmov'] = _rmov
+    register_builders['rfield'] = _rbinary(lambda a, b: mem[a + b])
+
+
+    #misc
+    def _debug(arg, nxt):
+        def f():
+            emit(acc)
+            return nxt
+        return f
+
+    def _halt(arg, nxt):
+        def f(): return end
+        return f
+
+    #host i/o, arg is the channel
+    io = channels() if io is None else io
+
+    def _write(arg, nxt):
+        def f():
+            io[arg].write(acc)
+            return nxt
+        return f
+
+    def _read(arg, nxt):
+        def f():
+            nonlocal acc
+            acc = io[arg].read()
+            return nxt
+        return f
+
+    def _send(arg, nxt): #acc is addr, pull() is count
+        def f():
+            nonlocal data
+            data += 1
+            send(io[arg], mem, acc, mem[data])
+            return nxt
+        return f
+
+    def _recv(arg, nxt): #acc is addr, pull() is count, acc = count read
+        def f():
+            nonlocal acc, data
+            data += 1
+            acc = recv(io[arg], mem, acc, mem[data])
+            return nxt
+        return f
+
+    def _flush(arg, nxt):
+        def f():
+            io[arg].flush()
+            return nxt
+        return f
+
+    def checkpoint(pc):
+        if on_snapshot is not None:
+            on_snapshot(pc, acc, data, stack, base, mem)
+
+    def _snapshot(arg, nxt):
+        def f():
+            checkpoint(nxt)
+            return nxt
+        return f
+
+
+    #entry to a jit block, counts until the target is hot. a block only
+    #runs if even its last check leaves room for size more steps
+    def _hot(pc, f):
+        def g():
+            nonlocal acc, data, stack, base, jitted
+            block = jit.cache.get(pc) or jit.heat(code, pc)
+            if block is None or block.size > fuel:
+                return f()
+
+            nxt, acc, data, stack, base, n = block(
+                acc, data, stack, base, mem, emit, io, regs, fuel - block.size + 1)
+            jitted += n - 1
+            return nxt
+        return g
+
+
+    #handler table, indexed by opcode
+    scope = locals()
+    builders = [
+        register_builders[name] if name in register_ops else scope[f"_{name}"]
+        for name in isa
+    ]
+    handlers = [
+        builders[op](arg, pc + 1)
+        for pc, (op, arg) in enumerate(code)
+    ]
+
+    if jit is not None:
+        targets = {
+            arg for op, arg in code
+            if op in (opcode['jump'], opcode['branch']) and arg < end
+        }
+        for pc in targets:
+            handlers[pc] = _hot(pc, handlers[pc])
+
+
+    #every call continues where the last one stopped
+    at = entry
+
+    #counts (optional) is a list receiving executions per pc,
+    #snapshot_at takes a checkpoint after that many steps,
+    #limit returns after that many steps for time slicing, or fewer once
+    #the code ends, and gives the steps run
+    def execute(count=False, counts=None, profile=None, snapshot_at=None, limit=None):
+        nonlocal at, fuel
+        pc = at
+        steps = 0
+        before = jitted
+
+        try:
+            if profile is not None:
+                return profile.run(handlers, code, end)
+
+            if counts is not None:
+                while pc < end:
+                    counts[pc] += 1
+                    pc = handlers[pc]()
+                return sum(counts)
+
+            if limit is not None:
+                while pc < end and steps + jitted - before < limit:
+                    fuel = limit - (steps + jitted - before)
+                    pc = handlers[pc]()
+                    steps += 1
+                return steps + jitted - before
+
+            if snapshot_at is not None:
+                while pc < end and steps < snapshot_at:
+                    pc = handlers[pc]()
+                    steps += 1
+                checkpoint(pc)
+
+            if not count:
+                while pc < end:
+                    pc = handlers[pc]()
+                return None
+
+            while pc < end:
+                pc = handlers[pc]()
+                steps += 1
+            return steps + jitted - before
+
+        finally:
+            at = pc
+            fuel = unlimited
+
+    #(pc, acc, data, stack, base) between calls
+    def state():
+        return at, acc, data, stack, base
+
+    #output still buffered is written out when the run ends, even on errors
+    def run(*args, **kwargs):
+        try:
+            return execute(*args, **kwargs)
+        finally:
+            for ch in io.values():
+                ch.flush()
+
+    run.state = state
+    return run
+
+
+
+#one embeddable machine: a build with its own memory, channels and jit.
+#step() and run() continue where the last call stopped, so many of them
+#can share one thread or event loop. reads from a channel without input
+#block the caller, including the event loop
+class VM:
+    def __init__(self, code, mem=None, jit=None, inputs=(), emit=print, io=None,
+            resume=None, budget=10000):
+        self.code = code
+        self.mem = memory() if mem is None else mem
+        self.io = channels() if io is None else io
+        self.jit = jit
+        self.budget = budget #steps between yields of run()
+        self.steps = 0
+
+        self.machine = engine(code, self.mem, jit, inputs, emit, self.io, resume)
+
+    #load a build the way vm.py runs it
+    @classmethod
+    def load(cls, path, natives=True, fused=True, **kwargs):
+        prog = load(path)
+        code = decode(prog)
+        if natives:
+            code = bind(code, routine_table(prog, path))
+        if fused:
+            code, _ = fuse(code)
+        return cls(code, **kwargs)
+
+    @property
+    def state(self):
+        return self.machine.state()
+
+    @property
+    def done(self):
+        return self.state[0] >= len(self.code)
+
+    #run n steps, fewer once halted. returns the steps run
+    def step(self, n=1):
+        ran = self.machine(limit=n)
+        self.steps += ran
+        return ran
+
+    #run to the end, giving the event loop a turn every budget steps
+    async def run(self):
+        while not self.done:
+            self.step(self.budget)
+            await asyncio.sleep(0)
+        return self.steps
+
+    def snapshot(self, path):
+        save_snapshot(path, fingerprint(self.code), *self.state, self.mem)
+
+
+
+#worker processes for spawn/join.
+#memory lives in one multiprocessing.shared_memory block: the memory of
+#the main program (mem_size words, self.mem) followed by a region of
+#region words per worker. a spawned routine runs in a free region, with
+#its system stack growing from the bottom of the region and its data
+#stack (arguments, results) from the top. pointers into the main memory
+#mean the same in every process.
+#
+#what a spawned routine may write, until it is joined:
+#   - its own region, which happens on its own through frames, the data
+#     stack and trans
+#   - memory handed to it that nothing else writes meanwhile: the main
+#     program and other jobs keep off it, e.g. disjoint parts of a chunk
+#it must not allocate from a heap shared with others (Heap::New and
+#Heap::Void write the heap), and the main program must not read what a
+#job writes before joining it. debug values of a job are emitted by the
+#main program when it joins the job, channels are the worker's own.
+#
+#workers are forked, so they share the block and the bound code as is.
+#words wrap silently like the array backend (ctypes truncates)
+class workers:
+    def __init__(self, code, mem_size=65536, count=None, region=4096,
+            threshold=jit.threshold):
+        count = count or os.cpu_count() or 1
+        words = mem_size + count * region
+
+        #the mapping is inherited by the forks, the name is not needed
+        self.block = shared_memory.SharedMemory(create=True, size=words * 8)
+        self.block.unlink()
+
+        self.mem = (ctypes.c_int64 * mem_size).from_buffer(self.block.buf)
+        self.free = [mem_size + k * region for k in range(count)]
+        self.jobs = {} #handle -> [future, region or None once finished]
+        self.handles = 0
+
+        self.pool = ProcessPoolExecutor(
+            max_workers = count,
+            mp_context = multiprocessing.get_context('fork'),
+            initializer = spawn_load,
+            initargs = (
+                code, (ctypes.c_int64 * words).from_buffer(self.block.buf),
+                region, threshold,
+            ),
+        )
+
+    #give the regions of finished jobs back
+    def reclaim(self):
+        for job in self.jobs.values():
+            if job[1] is not None and job[0].done():
+                self.free.append(job[1])
+                job[1] = None
+
+    #start routine addr with args (first one is pushed first), returns a
+    #handle. waits for a job to finish when every region is taken
+    def spawn(self, addr, args):
+        self.reclaim()
+        while not self.free:
+            running = [future for future, region in self.jobs.values() if region is not None]
+            wait(running, return_when=FIRST_COMPLETED)
+            self.reclaim()
+
+        region = self.free.pop()
+        handle = self.handles
+        self.handles += 1
+
+        self.jobs[handle] = [self.pool.submit(spawn_run, addr, args, region), region]
+        return handle
+
+    #wait for a job, returns its results (first one pushed first) and debug values
+    def join(self, handle):
+        if handle not in self.jobs:
+            raise ValueError(f"join of unknown job {handle}")
+
+        future, region = self.jobs.pop(handle)
+        results, out = future.result()
+        if region is not None:
+            self.free.append(region)
+        return results, out
+
+    #engines running on self.mem have to be gone by now
+    def close(self):
+        self.pool.shutdown()
+        self.pool = self.mem = None #the pool keeps the view of its initargs
+        gc.collect()
+        self.block.close()
+
+
+#per worker process state, set up once by spawn_load()
+spawned = {}
+
+def spawn_load(code, mem, region, threshold):
+    spawned['code'] = code
+    spawned['mem'] = mem
+    spawned['region'] = region
+    spawned['jit'] = None if threshold is None else jit(threshold=threshold)
+
+#run routine addr in the region at, like call from a frame whose return
+#address is the end of the code
+def spawn_run(addr, args, at):
+    code = spawned['code']
+    mem = spawned['mem']
+
+    top = at + spawned['region'] - 1
+    data, stack = top, at
+    for x in args:
+        mem[data] = x
+        data -= 1
+
+    mem[stack] = len(code)
+    mem[stack + 1] = stack
+    stack += 2
+
+    out = []
+    run = engine(
+        code, mem, spawned['jit'], emit=out.append,
+        resume=(addr, 0, data, stack, stack),
+    )
+    run()
+
+    _, _, data, _, _ = run.state()
+    return [mem[i] for i in range(top, data, -1)], out
+
+
+
+def report_fusion(code, hits, counts):
+    saved = {name: 0 for name in hits}
+    for pc, (op, _) in enumerate(code):
+        if op in fusion_width:
+            saved[isa[op]] += counts[pc] * (fusion_width[op] - 1)
+
+    print("fusion       sites  dispatches saved", file=sys.stderr)
+    for name in hits:
+        print(f"{name:12} {hits[name]:5}  {saved[name]:16}", file=sys.stderr)
+    print(f"{'total':12} {sum(hits.values()):5}  {sum(saved.values()):16}", file=sys.stderr)
+
+
+
+engines = ('decoded', 'match')
 
 def main():
-    
-    with open(sys.argv[1], 'r') as f:
-        prog = lex(f.read())
+    parser = argparse.ArgumentParser()
+    parser.add_argument('build')
+    parser.add_argument('--engine', choices=engines, default='decoded')
+    parser.add_argument('--memory', choices=memories, default='array',
+        help='memory backend of the decoded engine')
+    parser.add_argument('--mem-size', type=int, default=65536)
+    parser.add_argument('--stats', action='store_true',
+        help='report steps and instructions/sec on stderr')
+    parser.add_argument('--no-fuse', action='store_true',
+        help='do not fuse superinstructions at load')
+    parser.add_argument('--fusion-report', action='store_true',
+        help='report fused superinstructions and saved dispatches on stderr')
+    parser.add_argument('--no-jit', action='store_true',
+        help='interpret only, never compile hot blocks')
+    parser.add_argument('--jit-threshold', type=int, default=jit.threshold)
+    parser.add_argument('--profile', action='store_true',
+        help='profile opcodes, routines and loops, summary on stderr')
+    parser.add_argument('--collapsed', metavar='FILE',
+        help='with --profile, write collapsed call stacks for flamegraphs')
+    parser.add_argument('--snapshot', metavar='FILE',
+        help='write a snapshot at every snapshot instruction')
+    parser.add_argument('--snapshot-at', type=int, metavar='STEPS',
+        help='with --snapshot, also take one after that many steps (disables the jit)')
+    parser.add_argument('--restore', metavar='FILE',
+        help='continue from a snapshot instead of starting fresh')
+    parser.add_argument('--in', dest='inputs', action='append', default=[],
+        metavar='N=PATH[:bin]', help='read channel N from a file (0 is stdin by default)')
+    parser.add_argument('--out', dest='outputs', action='append', default=[],
+        metavar='N=PATH[:bin]', help='write channel N to a file')
+    parser.add_argument('--flush', choices=('full', 'always'), default='full',
+        help='write output when the buffer is full, or after every value')
+    parser.add_argument('--io-buffer', type=int, default=4096,
+        help='values buffered per output channel')
+    parser.add_argument('--no-natives', action='store_true',
+        help='run intrinsics through their snug routines')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(),
+        help='worker processes for spawn')
+    parser.add_argument('--worker-region', type=int, default=4096, metavar='WORDS',
+        help='stack region of every spawned routine')
+    parser.add_argument('--check-intrinsics', type=int, nargs='?', const=500, metavar='TRIALS',
+        help='check every intrinsic in the build against its snug routine')
+    parser.add_argument('--disasm', action='store_true',
+        help='print the text form of the build instead of running it')
+    args = parser.parse_args()
+
+    prog = load(args.build)
+
+    if args.disasm:
+        print(prog.render() if type(prog) is image else
+            "\n".join(f"{inst} {arg if arg is not None else ''}".strip() for inst, arg in prog))
+        return
+
+    capacity = 1 if args.flush == 'always' else args.io_buffer
+    io = channels(capacity)
+    for spec in args.inputs:
+        num, ch = open_channel(spec, 'r', capacity)
+        io[num] = ch
+    for spec in args.outputs:
+        num, ch = open_channel(spec, 'w', capacity)
+        io[num] = ch
+
+    routines = routine_table(prog, args.build)
+
+    if args.check_intrinsics:
+        results = conformance(decode(prog), routines, args.check_intrinsics)
+        for name, (cases, failures) in results.items():
+            status = "ok" if not failures else f"{len(failures)} mismatches, e.g. args {failures[0]}"
+            print(f"{name:16} {cases:5} cases  {status}")
+        if any(failures for _, failures in results.values()):
+            sys.exit(1)
+        return
+
+    #builds with spawn run on the shared memory of a worker pool
+    def pool_for(code):
+        if not any(op == opcode['spawn'] for op, _ in code):
+            return None
+        return workers(
+            code, args.mem_size, args.workers, args.worker_region,
+            None if args.no_jit else args.jit_threshold,
+        )
+
+    #an engine that raised on pool memory still holds views of it in the
+    #frames of the traceback, which keep the memory from being closed. so
+    #the error is reported and dropped first, then the pool is closed
+    failed = False
+
+    if args.profile:
+        prof = profiler(routines, prog.labels if type(prog) is image else {})
+
+        code = decode(prog)
+        pool = pool_for(code)
+        mem = memory(args.mem_size, args.memory) if pool is None else pool.mem
+        try:
+            engine(code, mem, emit=io[1].write, io=io, workers=pool)(profile=prof)
+        except BaseException:
+            if pool is None:
+                raise
+            traceback.print_exc()
+            failed = True
+        finally:
+            if pool is not None:
+                mem = None
+                pool.close()
+        if failed:
+            sys.exit(1)
+
+        print(prof.summary(), file=sys.stderr)
+        if args.collapsed:
+            with open(args.collapsed, 'w') as f:
+                f.write(prof.collapsed())
+        return
+
+    if args.engine == 'match' and type(prog) is image:
+        prog = prog.prog()
+    if args.engine == 'match' and any(inst in register_ops for inst, _ in prog):
+        sys.exit(f"{args.build}: the match engine does not run the register isa")
+    if args.engine == 'match' and any(inst in ('spawn', 'join') for inst, _ in prog):
+        sys.exit(f"{args.build}: the match engine does not run spawn and join")
+    if args.engine == 'match' and any(inst in ('write', 'read', 'send', 'recv', 'flush') for inst, _ in prog):
+        sys.exit(f"{args.build}: the match engine does not run i/o channels")
+
+    start = time.perf_counter()
+    match args.engine:
+        case 'decoded':
+            code = decode(prog)
+            if not args.no_natives:
+                code = bind(code, routines)
+            if not args.no_fuse:
+                code, hits = fuse(code)
+            build = fingerprint(code)
+
+            mem = memory(args.mem_size, args.memory)
+
+            resume = None
+            if args.restore:
+                saved, resume, mem = load_snapshot(args.restore, args.memory)
+                if saved != build:
+                    sys.exit(f"{args.restore}: snapshot was taken from a different build or fusion setting")
+
+            pool = pool_for(code)
+            if pool is not None:
+                if args.restore:
+                    pool.mem[:] = mem[:len(pool.mem)]
+                mem = pool.mem
+
+            hook = None
+            if args.snapshot:
+                def hook(*state):
+                    save_snapshot(args.snapshot, build, *state)
+
+            try:
+                if args.fusion_report and not args.no_fuse:
+                    #per pc counts need every step to go through the engine
+                    counts = [0] * len(code)
+                    steps = engine(code, mem, emit=io[1].write, io=io, workers=pool)(counts=counts)
+                    report_fusion(code, hits, counts)
+                else:
+                    tier = jit(threshold=args.jit_threshold)
+                    if args.no_jit or args.snapshot_at is not None:
+                        tier = None
+
+                    steps = engine(
+                        code, mem, tier, emit=io[1].write, io=io,
+                        resume=resume, on_snapshot=hook, workers=pool,
+                    )(count=args.stats, snapshot_at=args.snapshot_at)
+            except BaseException:
+                if pool is None:
+                    raise
+                traceback.print_exc()
+                failed = True
+            finally:
+                if pool is not None:
+                    mem = None
+                    pool.close()
+            if failed:
+                sys.exit(1)
+        case 'match':
+            steps = run(prog, args.mem_size)
+    elapsed = time.perf_counter() - start
 
-    run(prog)
+    if args.stats:
+        print(
+            f"{args.engine}: {steps} steps in {elapsed:.4f}s, "
+            f"{steps / elapsed:.0f} inst/s",
+            file=sys.stderr
+        )
 
 if __name__ == '__main__':
     main()